@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+
+# In-process stand-in for the part of the docker-py module DataLabAPI uses,
+# for benchmarking without a daemon. Every client call sleeps for a
+# configurable latency and is counted by operation name (matching the
+# CallStats names in DataLabAPI), so a run reports exactly which daemon
+# round trips a code path makes.
+#
+# Install it before DataLabAPI connects:
+#   sys.modules["docker"] = FakeDocker(containers=100)
+
+import itertools
+import threading
+import time
+try:
+	from Queue import Queue
+except ImportError:
+	from queue import Queue
+
+
+class FakeErrors:
+
+	class DockerException(Exception):
+		pass
+
+	class APIError(DockerException):
+		pass
+
+	class NotFound(APIError):
+		pass
+
+	class ImageNotFound(NotFound):
+		pass
+
+
+class FakeDocker:
+
+	errors = FakeErrors
+
+	def __init__(
+			self, containers=100, latency=0.001, latencies=None,
+			running_every=2, image_loaded=True, image_digest=None,
+			stats_interval=1.0
+	):
+		# latency applies to every call, latencies overrides it per operation
+		self.latency = latency
+		self.latencies = dict(latencies or {})
+		self.image_digest = image_digest
+		self.stats_interval = stats_interval
+		self.calls = {}
+		self.lock = threading.Lock()
+		self.released = threading.Event()
+		self.streams = []
+		# With build_hangs, builds stop producing output until abandoned
+		self.build_hangs = False
+		self.ids = itertools.count(1)
+		self.containers = {}
+		self.images = {}
+		if image_loaded:
+			self.add_image("dll_datalab:latest")
+		for index in range(containers):
+			ctr = self.add_container(
+				"datalab_%04d" % index, "project-%s" % (index % 7),
+				8081 + index
+			)
+			if index % running_every == 0:
+				ctr.state = u"running"
+
+	def DockerClient(self, timeout=None, **kwargs):
+		return FakeClient(self)
+
+	def call(self, operation):
+		with self.lock:
+			self.calls[operation] = self.calls.get(operation, 0) + 1
+		delay = self.latencies.get(operation, self.latency)
+		if delay:
+			time.sleep(delay)
+
+	def snapshot(self):
+		with self.lock:
+			return dict(self.calls)
+
+	def add_container(self, name, project_id, port, labels=None):
+		ctr_labels = {
+			u"dll_image": u"datalab",
+			u"dll_version": u"1.0",
+			u"dll_address": u"http://localhost:%s/" % port,
+			u"dll_deployment": u"Local",
+			u"dll_machine_info": u"-"
+		}
+		ctr_labels.update(labels or {})
+		ctr = FakeContainer(
+			self, u"%064x" % next(self.ids), name,
+			{u"PROJECT_ID": project_id, u"DATALAB_ENV": u"local"}, ctr_labels
+		)
+		try:
+			ctr.image_id = self.find_image("dll_datalab:latest").id
+		except FakeErrors.ImageNotFound:
+			pass
+		self.containers[ctr.id] = ctr
+		return ctr
+
+	def hang(self, name):
+		# Calls about this container block until release(), like a wedged exec
+		for ctr in self.containers.values():
+			if ctr.name == name:
+				ctr.hung = True
+
+	def release(self):
+		self.released.set()
+
+	def emit(self, action, ctr_id):
+		# Delivers a container event to every open events stream
+		event = {u"Type": u"container", u"Action": action, u"Actor": {u"ID": ctr_id}}
+		for stream in list(self.streams):
+			stream.put(event)
+
+	def add_image(self, tag):
+		for img in self.images.values():
+			if tag in img.tags:
+				img.tags.remove(tag)
+		img = FakeImage(self, u"sha256:%064x" % next(self.ids), [tag])
+		if self.image_digest is not None:
+			img.labels[u"dll_dockerfile_digest"] = self.image_digest
+		self.images[img.id] = img
+		return img
+
+	def find_image(self, name):
+		for img in self.images.values():
+			if name in img.tags:
+				return img
+		raise FakeErrors.ImageNotFound("No such image: %s" % name)
+
+
+class FakeContainer:
+
+	def __init__(self, daemon, ctr_id, name, env, labels):
+		self.daemon = daemon
+		self.id = ctr_id
+		self.name = name
+		self.env = env
+		self.labels = labels
+		self.state = u"exited"
+		self.image_id = u"sha256:%064x" % 0
+		self.hung = False
+
+	def wait_if_hung(self):
+		if self.hung:
+			self.daemon.released.wait()
+
+	def sparse(self):
+		# Shape of a containers.list(sparse=True) entry
+		return FakeContainerView(self, {
+			u"Id": self.id,
+			u"Names": [u"/" + self.name],
+			u"Labels": dict(self.labels),
+			u"State": self.state,
+			u"ImageID": self.image_id
+		})
+
+	def inspect(self):
+		return {
+			u"Id": self.id,
+			u"Name": u"/" + self.name,
+			u"State": {u"Status": self.state},
+			u"Config": {
+				u"Env": [u"%s=%s" % item for item in self.env.items()],
+				u"Labels": dict(self.labels)
+			}
+		}
+
+
+# What the client hands back: attrs frozen at list time, actions live
+class FakeContainerView:
+
+	def __init__(self, ctr, attrs):
+		self.ctr = ctr
+		self.attrs = attrs
+		self.id = ctr.id
+		self.name = ctr.name
+
+	def start(self):
+		self.ctr.daemon.call("container.start")
+		self.ctr.state = u"running"
+
+	def stop(self, timeout=10):
+		self.ctr.daemon.call("container.stop")
+		self.ctr.state = u"exited"
+
+	def restart(self, timeout=10):
+		self.ctr.daemon.call("container.restart")
+		self.ctr.state = u"running"
+
+	def remove(self, force=False):
+		self.ctr.daemon.call("container.remove")
+		if self.ctr.state == u"running" and not force:
+			raise FakeErrors.APIError("Container is running")
+		self.ctr.daemon.containers.pop(self.id, None)
+
+	def pause(self):
+		self.ctr.daemon.call("container.pause")
+		self.ctr.state = u"paused"
+
+	def unpause(self):
+		self.ctr.daemon.call("container.unpause")
+		self.ctr.state = u"running"
+
+	def rename(self, name):
+		self.ctr.daemon.call("container.rename")
+		self.ctr.name = name
+		self.name = name
+
+	def stats(self, decode=True, stream=True):
+		# An idle container: no CPU use or traffic, while it keeps running
+		self.ctr.daemon.call("stats")
+
+		def samples():
+			while self.ctr.state == u"running":
+				yield {
+					"cpu_stats": {
+						"cpu_usage": {"total_usage": 1000},
+						"system_cpu_usage": 10 ** 9, "online_cpus": 1
+					},
+					"precpu_stats": {
+						"cpu_usage": {"total_usage": 1000},
+						"system_cpu_usage": 10 ** 9 - 10 ** 7
+					},
+					"networks": {"eth0": {"rx_bytes": 0, "tx_bytes": 0}}
+				}
+				time.sleep(self.ctr.daemon.stats_interval)
+
+		return samples()
+
+	def exec_run(self, cmd, tty=False):
+		self.ctr.daemon.call("exec_run")
+		self.ctr.wait_if_hung()
+		output = "".join(
+			"%s=%s\r\n" % item for item in self.ctr.env.items()
+		)
+		return FakeExecResult(0, output.encode("utf-8"))
+
+
+class FakeExecResult:
+
+	def __init__(self, exit_code, output):
+		self.exit_code = exit_code
+		self.output = output
+
+
+class FakeImage:
+
+	def __init__(self, daemon, img_id, tags):
+		self.daemon = daemon
+		self.id = img_id
+		self.tags = list(tags)
+		self.labels = {u"dll_image": u"datalab", u"dll_version": u"1.0"}
+		self.created = time.time()
+
+	def tag(self, repository, tag):
+		self.daemon.call("image.tag")
+		name = "%s:%s" % (repository, tag)
+		for img in self.daemon.images.values():
+			if name in img.tags:
+				img.tags.remove(name)
+		self.tags.append(name)
+
+	def low_level(self):
+		return {
+			u"Id": self.id,
+			u"RepoTags": list(self.tags) or [u"<none>:<none>"],
+			u"Labels": dict(self.labels),
+			u"Created": self.created,
+			u"Size": 0
+		}
+
+
+class FakeClient:
+
+	def __init__(self, daemon):
+		self.daemon = daemon
+		self.containers = FakeContainers(daemon)
+		self.images = FakeImages(daemon)
+		self.api = FakeLowLevelAPI(daemon)
+
+	def events(self, decode=True, filters=None):
+		self.daemon.call("events")
+		stream = FakeEventStream(self.daemon.streams.remove)
+		self.daemon.streams.append(stream)
+		return stream
+
+
+class FakeContainers:
+
+	def __init__(self, daemon):
+		self.daemon = daemon
+
+	def list(self, all=False, sparse=False, filters=None):
+		self.daemon.call("containers.list")
+		filters = filters or {}
+		ctrs = list(self.daemon.containers.values())
+		if "id" in filters:
+			ctrs = [ctr for ctr in ctrs if ctr.id.startswith(filters["id"])]
+		if not all:
+			ctrs = [ctr for ctr in ctrs if ctr.state == u"running"]
+		return [ctr.sparse() for ctr in ctrs]
+
+	def create(self, **kwargs):
+		self.daemon.call("containers.create")
+		port = kwargs["ports"]["8080"][1]
+		ctr = self.daemon.add_container(
+			kwargs["name"], kwargs["environment"].get("PROJECT_ID"), port,
+			kwargs.get("labels")
+		)
+		ctr.env.update(kwargs["environment"])
+		return ctr.sparse()
+
+
+class FakeImages:
+
+	def __init__(self, daemon):
+		self.daemon = daemon
+
+	def list(self, all=False, name=None, filters=None):
+		self.daemon.call("images.list")
+		return list(self.daemon.images.values())
+
+	def get(self, name):
+		self.daemon.call("images.get")
+		return self.daemon.find_image(name)
+
+	def remove(self, name):
+		self.daemon.call("images.remove")
+		img = self.daemon.find_image(name)
+		img.tags.remove(name)
+
+
+class FakeLowLevelAPI:
+
+	def __init__(self, daemon):
+		self.daemon = daemon
+		# Session hooks, as on the requests session docker-py's client is
+		self.hooks = {"response": []}
+
+	def inspect_image(self, name):
+		self.daemon.call("inspect_image")
+		img = self.daemon.find_image(name)
+		return {u"Id": img.id, u"Config": {u"Labels": dict(img.labels)}}
+
+	def inspect_container(self, ctr_id):
+		self.daemon.call("inspect_container")
+		try:
+			ctr = self.daemon.containers[ctr_id]
+		except KeyError:
+			raise FakeErrors.NotFound("No such container: %s" % ctr_id)
+		ctr.wait_if_hung()
+		return ctr.inspect()
+
+	def images(self, filters=None):
+		self.daemon.call("images")
+		return [img.low_level() for img in self.daemon.images.values()]
+
+	def remove_image(self, img_id):
+		self.daemon.call("remove_image")
+		self.daemon.images.pop(img_id, None)
+
+	def prune_images(self, filters=None):
+		self.daemon.call("prune_images")
+		return {u"SpaceReclaimed": 0}
+
+	def build(self, tag=None, labels=None, decode=True, **kwargs):
+		self.daemon.call("build")
+		response = FakeResponse()
+		for hook in list(self.hooks["response"]):
+			hook(response)
+		return self.build_output(response, tag, labels)
+
+	def build_output(self, response, tag, labels):
+		yield {"stream": "Step 1/1 : FROM gcr.io/cloud-datalab/datalab:local\n"}
+		if self.daemon.build_hangs:
+			response.closed.wait()
+		if response.closed.is_set():
+			raise FakeErrors.APIError("Connection closed")
+		img = self.daemon.add_image(tag)
+		img.labels.update(labels or {})
+		yield {"aux": {"ID": img.id}}
+
+
+# The HTTP response of a streaming call; closing it drops the connection
+class FakeResponse:
+
+	def __init__(self):
+		self.closed = threading.Event()
+
+	def close(self):
+		self.closed.set()
+
+
+# Blocks like a real events stream, yielding whatever is put on it, until
+# closed
+class FakeEventStream:
+
+	def __init__(self, on_close=None):
+		self.events = Queue()
+		self.on_close = on_close
+		self.closed = threading.Event()
+
+	def __iter__(self):
+		while True:
+			event = self.events.get()
+			if event is None:
+				return
+			yield event
+
+	def put(self, event):
+		self.events.put(event)
+
+	def close(self):
+		if not self.closed.is_set():
+			self.closed.set()
+			self.events.put(None)
+			if self.on_close is not None:
+				self.on_close(self)
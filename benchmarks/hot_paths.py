@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Offline benchmark of the launcher's hot paths as the number of containers
+# grows, run against the in-process fake daemon in benchmarks.fake_docker.
+# For each operation it reports wall time, the daemon calls made (by
+# operation) and the files written, including the containers.json flush the
+# operation causes.
+#
+#   connect              - DataLabAPI construction (client + registry seed)
+#   get_ctrs_info        - the container list payload, cold then warm
+#   check_image_loaded   - the startup image presence check
+#   check_for_update     - Dockerfile digest comparison, cold then warm
+#   startup checks       - the launcher's startup stage pipeline
+#   update_ctr_list      - one container list refresh, cold then warm
+#   check_entries        - one entry validation, for an existing and a new name
+#
+# The launcher operations run the real DataLabLauncher methods with the
+# window left out, so they need PyGObject installed; without it only the
+# DataLabAPI operations run.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.hot_paths [--containers 10,100,1000] [--latency 1]
+#   python -m benchmarks.hot_paths --save baseline.json
+#   python -m benchmarks.hot_paths --baseline baseline.json [--time-tolerance 2]
+#
+# With --baseline the run fails (exit status 1) if any operation makes more
+# daemon calls or file writes than recorded, or, given a tolerance, takes
+# more than that multiple of the recorded wall time.
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+try:
+	import __builtin__ as builtins
+except ImportError:
+	import builtins
+
+from benchmarks.fake_docker import FakeDocker
+
+dockerfile_content = (
+	"FROM gcr.io/cloud-datalab/datalab:local\n"
+	"LABEL \"dll_image\"=\"datalab\"\n"
+	"LABEL \"dll_version\"=\"1.0\"\n"
+)
+
+
+# Counts files opened for writing while installed
+class FileWrites:
+
+	def __init__(self):
+		self.count = 0
+		self.lock = threading.Lock()
+		self.open = builtins.open
+		self.fdopen = os.fdopen
+
+	@staticmethod
+	def writing(mode):
+		return any(flag in mode for flag in "wax+")
+
+	def counted(self, func):
+		def inner_func(target, mode="r", *args, **kwargs):
+			if self.writing(mode):
+				with self.lock:
+					self.count += 1
+			return func(target, mode, *args, **kwargs)
+
+		return inner_func
+
+	def install(self):
+		builtins.open = self.counted(self.open)
+		os.fdopen = self.counted(self.fdopen)
+
+	def uninstall(self):
+		builtins.open = self.open
+		os.fdopen = self.fdopen
+
+
+class Workspace:
+
+	def __init__(self, containers):
+		self.root = tempfile.mkdtemp(prefix="dll-bench-")
+		self.local_drive = os.path.join(self.root, "drive")
+		self.local_dockerfile = os.path.join(self.root, "local") + os.sep
+		self.latest_dockerfile = os.path.join(self.root, "shared") + os.sep
+		self.containers_logfile = os.path.join(self.root, "containers.json")
+		with open(self.containers_logfile, "w") as containers_log:
+			containers_log.write("{}")
+		for folder in [self.local_dockerfile, self.latest_dockerfile]:
+			os.makedirs(folder)
+			with open(folder + "Dockerfile", "w") as dockerfile:
+				dockerfile.write(dockerfile_content)
+		# Every container has a credentials file, as after a gcloud login
+		for index in range(containers):
+			config = os.path.join(
+				self.local_drive, "containers", "datalab_%04d" % index, ".config"
+			)
+			os.makedirs(config)
+			with open(os.path.join(config, "credentials"), "w") as credentials:
+				json.dump(
+					{"data": [{"key": {"account": "user%s@example.com" % index}}]},
+					credentials
+				)
+		self.settings = {
+			"docker_client_timeout": 30,
+			"local_drive": self.local_drive,
+			"latest_dockerfile": self.latest_dockerfile,
+			"drives": [],
+			"service_socket": None,
+			"background_updates": False,
+			"metadata_timeout": 60
+		}
+
+	def remove(self):
+		shutil.rmtree(self.root, ignore_errors=True)
+
+
+def measure(daemon, writes, func):
+	calls = daemon.snapshot()
+	written = writes.count
+	start = time.time()
+	func()
+	wall = time.time() - start
+	after = daemon.snapshot()
+	return {
+		"wall": round(wall, 4),
+		"calls": dict(
+			(operation, count - calls.get(operation, 0))
+			for operation, count in after.items()
+			if count != calls.get(operation, 0)
+		),
+		"writes": writes.count - written
+	}
+
+
+def api_operations(workspace):
+	from src.datalab_api import DataLabAPI
+	state = {}
+
+	def connect():
+		state["datalab"] = DataLabAPI(
+			platform.system(), 30, workspace.containers_logfile,
+			workspace.local_drive, metadata_timeout=60, watch_events=False
+		)
+
+	def flushed(func):
+		def inner_func():
+			func(state["datalab"])
+			state["datalab"].save_containers_log()
+
+		return inner_func
+
+	def check_for_update(datalab):
+		datalab.check_for_update(
+			workspace.local_dockerfile, workspace.latest_dockerfile
+		)
+
+	operations = [
+		("connect", connect),
+		("get_ctrs_info (cold)", flushed(lambda datalab: datalab.get_ctrs_info())),
+		("get_ctrs_info (warm)", flushed(lambda datalab: datalab.get_ctrs_info())),
+		("check_image_loaded", flushed(lambda datalab: datalab.check_image_loaded())),
+		("check_for_update (cold)", flushed(check_for_update)),
+		("check_for_update (warm)", flushed(check_for_update)),
+	]
+
+	def close():
+		if "datalab" in state:
+			state["datalab"].close()
+
+	return operations, close
+
+
+def headless_launcher(workspace):
+	try:
+		from src.launcher import DataLabLauncher
+	except (ImportError, ValueError) as e:
+		logging.warning("Skipping launcher operations: %s" % e)
+		return None
+	from src.jobs import JobExecutor
+
+	class HeadlessLauncher(DataLabLauncher):
+
+		# The real launcher logic with no window: UI updates are dropped
+		def __init__(self, workspace):
+			self.os_type = platform.system()
+			self.settings = workspace.settings
+			self.local_dockerfile = workspace.local_dockerfile
+			self.containers_logfile = workspace.containers_logfile
+			self.refresh_lock = threading.Lock()
+			self.jobs = JobExecutor(1)
+			self.entry_result = None
+			self.rows = None
+
+		def create_local_api(self, watch_events=True):
+			# Left off so call counts don't depend on the watcher thread
+			return DataLabLauncher.create_local_api(self, watch_events=False)
+
+		def change_check_label(self, label, string, colour="black"):
+			pass
+
+		def write_to_statusbar(self, string):
+			pass
+
+		def apply_entry_check(self, generation, result):
+			self.entry_result = result
+
+		def populate_ctr_list(self, ctrs_info):
+			self.rows = len(ctrs_info)
+
+	return HeadlessLauncher(workspace)
+
+
+def launcher_operations(launcher):
+	from src.pipeline import StagePipeline
+
+	def flushed(func):
+		def inner_func():
+			func()
+			launcher.datalab.save_containers_log()
+
+		return inner_func
+
+	def startup_checks():
+		# Hold check_api's list refresh back; it is measured on its own
+		launcher.refresh_holds += 1
+		StagePipeline(launcher.startup_stages()).run()
+		launcher.refresh_holds -= 1
+		launcher.datalab.save_containers_log()
+
+	def update_ctr_list():
+		launcher.refresh_running = True
+		launcher.refresh_ctr_list()
+
+	def check_entries(name, project):
+		return lambda: launcher.validate_entries(
+			launcher.check_generation, name, project, "Local", ""
+		)
+
+	operations = [
+		("startup checks", startup_checks),
+		("update_ctr_list (cold)", flushed(update_ctr_list)),
+		("update_ctr_list (warm)", flushed(update_ctr_list)),
+		("check_entries (existing)", flushed(check_entries("datalab_0000", ""))),
+		("check_entries (new)", flushed(check_entries("new_container", "project"))),
+	]
+
+	def close():
+		launcher.datalab.close()
+		launcher.jobs.shutdown()
+
+	return operations, close
+
+
+def run_scenario(containers, latency, exec_latency):
+	workspace = Workspace(containers)
+	with open(workspace.latest_dockerfile + "Dockerfile", "rb") as dockerfile:
+		digest = hashlib.sha256(dockerfile.read()).hexdigest()
+	writes = FileWrites()
+	results = []
+	try:
+		groups = [lambda: api_operations(workspace)]
+		launcher = headless_launcher(workspace)
+		if launcher is not None:
+			groups.append(lambda: launcher_operations(launcher))
+		for group in groups:
+			# A fresh daemon per group, so the launcher starts cold too
+			daemon = FakeDocker(
+				containers=containers, latency=latency,
+				latencies={"exec_run": exec_latency}, image_digest=digest
+			)
+			sys.modules["docker"] = daemon
+			operations, close = group()
+			writes.install()
+			try:
+				for name, func in operations:
+					result = measure(daemon, writes, func)
+					result["operation"] = name
+					results.append(result)
+			finally:
+				writes.uninstall()
+				close()
+	finally:
+		sys.modules.pop("docker", None)
+		workspace.remove()
+	return results
+
+
+def print_results(containers, latency, results):
+	print("%s containers, %.1f ms per daemon call" % (containers, latency * 1000))
+	print("  %-26s %10s %6s %6s  %s" % ("operation", "wall ms", "calls", "writes", "daemon calls"))
+	for result in results:
+		print("  %-26s %10.1f %6s %6s  %s" % (
+			result["operation"], result["wall"] * 1000,
+			sum(result["calls"].values()), result["writes"],
+			", ".join(
+				"%s %s" % item for item in sorted(result["calls"].items())
+			)
+		))
+	print("")
+
+
+def compare(runs, baseline, time_tolerance=None):
+	failures = []
+	for containers, results in runs.items():
+		recorded = dict(
+			(result["operation"], result)
+			for result in baseline.get("runs", {}).get(containers, [])
+		)
+		for result in results:
+			base = recorded.get(result["operation"])
+			if base is None:
+				continue
+			label = "%s containers, %s" % (containers, result["operation"])
+			calls = sum(result["calls"].values())
+			base_calls = sum(base["calls"].values())
+			if calls > base_calls:
+				failures.append(
+					"%s: %s daemon calls, baseline %s" % (label, calls, base_calls)
+				)
+			if result["writes"] > base["writes"]:
+				failures.append("%s: %s file writes, baseline %s" % (
+					label, result["writes"], base["writes"]
+				))
+			if time_tolerance and result["wall"] > base["wall"] * time_tolerance:
+				failures.append("%s: %.1f ms, baseline %.1f ms" % (
+					label, result["wall"] * 1000, base["wall"] * 1000
+				))
+	return failures
+
+
+def build_parser():
+	parser = argparse.ArgumentParser(
+		description="Benchmark the launcher's hot paths against a fake daemon"
+	)
+	parser.add_argument(
+		"--containers", default="10,100,1000",
+		help="Comma-separated container counts (default: 10,100,1000)"
+	)
+	parser.add_argument(
+		"--latency", type=float, default=1.0,
+		help="Milliseconds per daemon call (default: 1)"
+	)
+	parser.add_argument(
+		"--exec-latency", type=float, default=20.0,
+		help="Milliseconds per exec_run (default: 20)"
+	)
+	parser.add_argument("--json", action="store_true", help="Print results as JSON")
+	parser.add_argument("--save", help="Write the results to this file")
+	parser.add_argument("--baseline", help="Fail on regressions against this file")
+	parser.add_argument(
+		"--time-tolerance", type=float,
+		help="With --baseline, also fail if wall time exceeds baseline times this"
+	)
+	return parser
+
+
+def main(argv=None):
+	args = build_parser().parse_args(argv)
+	logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+	latency = args.latency / 1000.0
+	report = {
+		"latency": latency,
+		"exec_latency": args.exec_latency / 1000.0,
+		"runs": {}
+	}
+	for containers in [int(count) for count in args.containers.split(",")]:
+		results = run_scenario(containers, latency, report["exec_latency"])
+		report["runs"][str(containers)] = results
+		if not args.json:
+			print_results(containers, latency, results)
+	if args.json:
+		print(json.dumps(report, indent=2, sort_keys=True))
+	if args.save:
+		with open(args.save, "w") as output:
+			json.dump(report, output, indent=2, sort_keys=True)
+	if args.baseline:
+		with open(args.baseline) as data:
+			baseline = json.load(data)
+		failures = compare(report["runs"], baseline, args.time_tolerance)
+		for failure in failures:
+			print("REGRESSION: " + failure, file=sys.stderr)
+		return 1 if failures else 0
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Compares the two ways of resolving a container's PROJECT_ID against the
+# running DataLab containers on this host:
+#   exec    - `bash -c printenv` inside the container (the live refresh)
+#   inspect - Config.Env from the inspect data, cold then cached
+#
+# Usage (from the repository root): python -m benchmarks.project_lookup
+
+import json
+import os
+import platform
+import time
+
+from src.datalab_api import DataLabAPI
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def timed(func, ctrs, rounds):
+	start = time.time()
+	for _ in range(rounds):
+		for ctr in ctrs:
+			func(ctr)
+	return (time.time() - start) / (rounds * len(ctrs))
+
+
+if __name__ == "__main__":
+	with open(os.path.join(root, "settings.json")) as data:
+		settings = json.load(data)
+	datalab = DataLabAPI(
+		platform.system(), settings["docker_client_timeout"],
+		os.path.join(root, "containers.json"), settings["local_drive"]
+	)
+	ctrs = datalab.get_running_ctrs()
+	if not ctrs:
+		raise SystemExit("No running DataLab containers to benchmark against")
+	rounds = 5
+	exec_time = timed(datalab.exec_ctr_project, ctrs, rounds)
+	cold_time = timed(datalab.get_ctr_env, ctrs, 1)
+	warm_time = timed(datalab.get_ctr_env, ctrs, rounds)
+	datalab.close()
+	print("Containers: %s, rounds: %s" % (len(ctrs), rounds))
+	print("exec printenv : %8.2f ms per container" % (exec_time * 1000))
+	print("inspect (cold): %8.2f ms per container" % (cold_time * 1000))
+	print("inspect (warm): %8.4f ms per container" % (warm_time * 1000))
@@ -0,0 +1,5 @@
+from src import cli
+import sys
+
+if __name__ == "__main__":
+	sys.exit(cli.main())
@@ -11,7 +11,6 @@ import os
 # TODO: Implement Regex check/replace on ctr names (i.e. whitespace; single character)
 # TODO: Test Cloud Project
 # TODO: Sanitize Error Messages
-# TODO: Properly handle old images
 # TODO: Fix Pulling User and Project Info
 # TODO: Fix Menubar and Options
 # TODO: Tooltip for Missing Shared Drives
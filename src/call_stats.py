@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# Per-operation call counts, error counts and latencies. The percentiles are
+# taken over the most recent `samples` calls of each operation so a long
+# session doesn't grow without bound; count, errors, total and max cover
+# every call.
+class CallStats:
+
+	def __init__(self, samples=1000):
+		self.samples = samples
+		self.operations = {}
+		self.lock = threading.Lock()
+
+	def record(self, operation, duration, failed=False):
+		with self.lock:
+			stats = self.operations.get(operation)
+			if stats is None:
+				stats = self.operations[operation] = {
+					"count": 0,
+					"errors": 0,
+					"total": 0.0,
+					"max": 0.0,
+					"latencies": deque(maxlen=self.samples)
+				}
+			stats["count"] += 1
+			stats["total"] += duration
+			stats["max"] = max(stats["max"], duration)
+			stats["latencies"].append(duration)
+			if failed:
+				stats["errors"] += 1
+
+	@contextmanager
+	def timed(self, operation):
+		start = time.time()
+		failed = False
+		try:
+			yield
+		except Exception:
+			failed = True
+			raise
+		finally:
+			self.record(operation, time.time() - start, failed)
+
+	@staticmethod
+	def percentile(latencies, fraction):
+		ordered = sorted(latencies)
+		if not ordered:
+			return 0.0
+		return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+	def summary(self):
+		# Seconds, per operation
+		with self.lock:
+			operations = dict(
+				(operation, dict(stats, latencies=list(stats["latencies"])))
+				for operation, stats in self.operations.items()
+			)
+		return dict(
+			(operation, {
+				"count": stats["count"],
+				"errors": stats["errors"],
+				"total": round(stats["total"], 4),
+				"p50": round(self.percentile(stats["latencies"], 0.5), 4),
+				"p95": round(self.percentile(stats["latencies"], 0.95), 4),
+				"max": round(stats["max"], 4)
+			})
+			for operation, stats in operations.items()
+		)
+
+	def dump(self):
+		return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+	def reset(self):
+		with self.lock:
+			self.operations = {}
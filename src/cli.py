@@ -0,0 +1,272 @@
+from __future__ import print_function
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import webbrowser
+
+from src.datalab_api import DataLabAPI
+from src.image_build import BuildCancelled
+from src.readiness import wait_until_ready
+
+# Headless front end to DataLabAPI. Nothing here (or in DataLabAPI) imports
+# GTK, so it runs on machines without a display server.
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+settings_file = os.path.join(root, "settings.json")
+containers_logfile = os.path.join(root, "containers.json")
+local_dockerfile = root + os.sep
+
+
+class CommandError(Exception):
+	pass
+
+
+def load_settings():
+	with open(settings_file) as data:
+		return json.load(data)
+
+
+def connect(settings, watch_events=False):
+	# Go through the background service when one is running
+	socket_path = settings.get("service_socket")
+	if socket_path and not watch_events:
+		from src.service import ServiceClient, RemoteDataLabAPI
+		if ServiceClient(socket_path).available():
+			return RemoteDataLabAPI(
+				socket_path, batch_workers=settings.get("batch_workers", 16)
+			)
+	return DataLabAPI.from_settings(
+		platform.system(), settings, containers_logfile, watch_events
+	)
+
+
+def find_ctr(datalab, name):
+	ctr = datalab.get_ctr_by_name(name)
+	if ctr is None:
+		raise CommandError("No DataLab container named %s" % name)
+	return ctr
+
+
+def output(args, result, lines):
+	if args.json:
+		print(json.dumps(result, indent=2, sort_keys=True))
+	else:
+		for line in lines:
+			print(line)
+
+
+# Commands
+
+def cmd_list(datalab, settings, args):
+	ctrs_info = sorted(datalab.get_ctrs_info(), key=lambda info: info["Name"])
+	columns = ["Name", "Status", "Project ID", "User", "Version", "Address"]
+	rows = [columns] + [[info[col] or "-" for col in columns] for info in ctrs_info]
+	widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+	output(args, ctrs_info, [
+		"  ".join(value.ljust(width) for value, width in zip(row, widths))
+		for row in rows
+	])
+
+
+def cmd_status(datalab, settings, args):
+	image_info = datalab.get_image_info()
+	status = {
+		"api": "connected",
+		"image_loaded": image_info is not None,
+		"image_version": image_info["version"] if image_info else None,
+		"image_digest": image_info["digest"] if image_info else None,
+		"containers": len(datalab.get_datalab_ctrs()),
+		"running": [
+			datalab.get_ctr_name(ctr) for ctr in datalab.get_running_ctrs()
+		]
+	}
+	try:
+		status["update_available"] = datalab.check_for_update(
+			local_dockerfile, settings['latest_dockerfile'], image_info
+		)
+	except Exception as e:
+		logging.error("Failed to check for updates: %s" % e)
+		status["update_available"] = None
+	output(args, status, [
+		"Docker API:       %s" % status["api"],
+		"Image loaded:     %s" % status["image_loaded"],
+		"Image version:    %s" % (status["image_version"] or "-"),
+		"Image digest:     %s" % (status["image_digest"] or "-"),
+		"Update available: %s" % status["update_available"],
+		"Containers:       %s (%s running)"
+		% (status["containers"], len(status["running"]))
+	])
+
+
+def cmd_create(datalab, settings, args):
+	gateway = args.gateway if args.deployment == "Cloud" else None
+	if args.deployment == "Cloud" and not gateway:
+		raise CommandError("Cloud deployments need --gateway")
+	ctr = datalab.create_container(
+		args.name or "", args.project, args.deployment, gateway,
+		settings["local_drive"], settings["drives"]
+	)
+	name = datalab.get_ctr_name(ctr)
+	ctr = datalab.get_ctr_by_name(name) or ctr
+	result = {"name": name, "address": datalab.get_ctr_address(ctr)}
+	output(args, result, ["Created %s at %s" % (name, result["address"])])
+
+
+def cmd_start(datalab, settings, args):
+	datalab.start_container(find_ctr(datalab, args.name))
+	output(args, {"name": args.name, "started": True}, ["Started %s" % args.name])
+
+
+def cmd_stop(datalab, settings, args):
+	datalab.stop_container(find_ctr(datalab, args.name))
+	output(args, {"name": args.name, "stopped": True}, ["Stopped %s" % args.name])
+
+
+def cmd_open(datalab, settings, args):
+	ctr = find_ctr(datalab, args.name)
+	if not datalab.is_ctr_up(ctr):
+		raise CommandError("%s is not running" % args.name)
+	datalab.wake_container(ctr)
+	address = datalab.get_ctr_address(ctr)
+	ready_time = wait_until_ready(address, settings.get("opening_timeout", 60))
+	if not args.no_browser:
+		webbrowser.open(address, new=True)
+	output(
+		args, {"name": args.name, "address": address, "ready_time": ready_time},
+		["%s ready at %s in %.1fs" % (args.name, address, ready_time)]
+	)
+
+
+def cmd_update(datalab, settings, args):
+	def progress(message):
+		if not args.json:
+			print(message, file=sys.stderr)
+	datalab.update_image(settings["latest_dockerfile"], progress=progress)
+	with open(settings["latest_dockerfile"] + "Dockerfile", 'r') as latest_file:
+		datalab.update_local_dockerfile(local_dockerfile, latest_file.read())
+	output(args, {"updated": True}, ["DataLab Image successfully updated"])
+
+
+def cmd_watch(datalab, settings, args):
+	# Daemon-style: stays attached to the events stream and reports the
+	# container list every time it changes
+	changed = threading.Event()
+	datalab.registry.add_listener(changed.set)
+	datalab.registry.start()
+	try:
+		while True:
+			changed.wait(3600)
+			changed.clear()
+			cmd_list(datalab, settings, args)
+	except KeyboardInterrupt:
+		pass
+
+
+def cmd_serve(datalab, settings, args):
+	from src.service import DataLabService
+	service = DataLabService(
+		datalab, args.socket or settings.get("service_socket")
+		or "~/.datalab-launcher.sock"
+	)
+	datalab.standby_pool.start()
+	datalab.idle_manager.start()
+	try:
+		service.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		logging.info(
+			"Docker call timings (seconds): "
+			+ json.dumps(datalab.get_call_stats(), indent=2, sort_keys=True)
+		)
+
+
+commands = {
+	"list": cmd_list,
+	"status": cmd_status,
+	"create": cmd_create,
+	"start": cmd_start,
+	"stop": cmd_stop,
+	"open": cmd_open,
+	"update": cmd_update,
+	"watch": cmd_watch,
+	"serve": cmd_serve,
+}
+
+
+def build_parser():
+	parser = argparse.ArgumentParser(
+		description="Manage DataLab containers without the GUI"
+	)
+	parser.add_argument(
+		'-d', '--debug',
+		help="Print lots of debugging statements",
+		action="store_const", dest="loglevel", const=logging.DEBUG,
+		default=logging.WARNING,
+	)
+	parser.add_argument(
+		'-v', '--verbose',
+		help="Be verbose",
+		action="store_const", dest="loglevel", const=logging.INFO,
+	)
+	parser.add_argument(
+		'--json', help="Print results as JSON", action="store_true"
+	)
+	subparsers = parser.add_subparsers(dest="command")
+	subparsers.required = True
+	subparsers.add_parser("list", help="List DataLab containers")
+	subparsers.add_parser("status", help="Show API, image and container status")
+	create = subparsers.add_parser("create", help="Create a DataLab container")
+	create.add_argument("--name", default="", help="Generated if omitted")
+	create.add_argument("--project", required=True, help="GCP Project ID")
+	create.add_argument(
+		"--deployment", choices=["Local", "Cloud"], default="Local"
+	)
+	create.add_argument("--gateway", help="Gateway VM for Cloud deployments")
+	for name, help_text in [
+		("start", "Start a container"),
+		("stop", "Stop a container"),
+	]:
+		subparsers.add_parser(name, help=help_text).add_argument("name")
+	open_parser = subparsers.add_parser(
+		"open", help="Wait for a container's DataLab server and open it"
+	)
+	open_parser.add_argument("name")
+	open_parser.add_argument(
+		"--no-browser", action="store_true", help="Only wait until it's ready"
+	)
+	subparsers.add_parser("update", help="Rebuild the DataLab Image")
+	subparsers.add_parser("watch", help="Print the container list on every change")
+	serve = subparsers.add_parser(
+		"serve", help="Run the background service other front ends connect to"
+	)
+	serve.add_argument("--socket", help="Unix socket path to listen on")
+	return parser
+
+
+def main(argv=None):
+	args = build_parser().parse_args(argv)
+	logging.basicConfig(
+		level=args.loglevel, stream=sys.stderr,
+		format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+	)
+	datalab = None
+	try:
+		settings = load_settings()
+		datalab = connect(settings, watch_events=args.command == "serve")
+		commands[args.command](datalab, settings, args)
+		return 0
+	except (CommandError, BuildCancelled) as e:
+		print("Error: %s" % e, file=sys.stderr)
+		return 1
+	except Exception as e:
+		logging.debug("Command failed", exc_info=True)
+		print("Error: %s" % (getattr(e, "message", None) or e), file=sys.stderr)
+		return 1
+	finally:
+		if datalab is not None:
+			datalab.close()
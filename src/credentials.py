@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+# Per-container cache of the user account found in each container's
+# .config/credentials file. Files are only re-parsed when their (mtime, size)
+# changes, and the stats for every container come from one scan of the
+# containers directory, repeated at most every scan_interval seconds. Only
+# one thread scans at a time; the others wait for its result.
+class CredentialsCache:
+
+	def __init__(self, containers_dir, scan_interval=5):
+		self.containers_dir = containers_dir
+		self.scan_interval = scan_interval
+		self.accounts = {}
+		self.stats = {}
+		self.last_scan = None
+		self.lock = threading.RLock()
+		self.scan_lock = threading.Lock()
+
+	def credentials_path(self, name):
+		return os.path.join(self.containers_dir, name, ".config", "credentials")
+
+	def is_stale(self):
+		with self.lock:
+			return (
+				self.last_scan is None
+				or time.time() - self.last_scan > self.scan_interval
+			)
+
+	def scan(self):
+		stats = {}
+		try:
+			names = os.listdir(self.containers_dir)
+		except OSError:
+			names = []
+		for name in names:
+			try:
+				stat = os.stat(self.credentials_path(name))
+			except OSError:
+				continue
+			stats[name] = (stat.st_mtime, stat.st_size)
+		with self.lock:
+			self.stats = stats
+			self.last_scan = time.time()
+			# Forget containers whose credentials have gone
+			for name in list(self.accounts):
+				if name not in stats:
+					self.accounts.pop(name)
+
+	def invalidate(self, name=None):
+		# Rescan on the next read, re-parsing name's file if given
+		with self.lock:
+			self.last_scan = None
+			if name is not None:
+				self.accounts.pop(name, None)
+
+	def read_account(self, name):
+		with open(self.credentials_path(name), 'r') as file:
+			creds = json.load(file)
+		try:
+			return creds['data'][0]['key']['account']
+		except Exception as e:
+			logging.error("Cannot pull ctr_user from credentials file")
+			return "-"
+
+	# Returns the account, or None if the container has no credentials file
+	def get_user(self, name):
+		if self.is_stale():
+			with self.scan_lock:
+				if self.is_stale():
+					self.scan()
+		with self.lock:
+			key = self.stats.get(name)
+			cached = self.accounts.get(name)
+		if key is None:
+			return None
+		if cached is not None and cached[0] == key:
+			return cached[1]
+		account = self.read_account(name)
+		with self.lock:
+			self.accounts[name] = (key, account)
+		return account
@@ -0,0 +1,156 @@
+import logging
+import threading
+
+
+# In-memory view of the DataLab containers, seeded from one listing and kept
+# current from the Docker events stream (see start()). The daemon is only reached through
+# the seed/fetch/events callables, so a fake event source can drive it.
+class ContainerRegistry:
+
+	# Events which change what we know about a container
+	watched_events = [
+		"create", "start", "stop", "die", "destroy", "rename",
+		"pause", "unpause"
+	]
+
+	def __init__(self, seed, fetch, events, get_name, resync_delay=1):
+		self.seed = seed
+		self.fetch = fetch
+		self.events = events
+		self.get_name = get_name
+		self.resync_delay = resync_delay
+		self.ctrs = {}
+		self.names = {}
+		self.listeners = []
+		self.event_listeners = []
+		self.synced = False
+		self.stream = None
+		self.thread = None
+		self.lock = threading.RLock()
+		self.stopped = threading.Event()
+
+	# Reads
+
+	def get(self, name):
+		with self.lock:
+			return self.ctrs.get(name)
+
+	def list(self):
+		with self.lock:
+			return list(self.ctrs.values())
+
+	# Listeners
+
+	def add_listener(self, func):
+		self.listeners.append(func)
+
+	# Event listeners get each handled event, plus {"Action": "resync"}
+	# whenever the whole registry is reloaded
+	def add_event_listener(self, func):
+		self.event_listeners.append(func)
+
+	def remove_event_listener(self, func):
+		if func in self.event_listeners:
+			self.event_listeners.remove(func)
+
+	def notify_event(self, event):
+		for func in list(self.event_listeners):
+			try:
+				func(event)
+			except Exception as e:
+				logging.error("Container registry event listener failed: %s" % e)
+
+	def notify(self):
+		for func in self.listeners:
+			try:
+				func()
+			except Exception as e:
+				logging.error("Container registry listener failed: %s" % e)
+
+	# Updates
+
+	def resync(self):
+		ctrs = self.seed()
+		with self.lock:
+			self.ctrs = {}
+			self.names = {}
+			for ctr in ctrs:
+				self.upsert(ctr)
+			self.synced = True
+		logging.debug("Container registry synced: %s containers" % len(ctrs))
+		self.notify_event({"Action": "resync"})
+		self.notify()
+
+	def upsert(self, ctr):
+		with self.lock:
+			self.discard(ctr.id)
+			name = self.get_name(ctr)
+			self.ctrs[name] = ctr
+			self.names[ctr.id] = name
+
+	def discard(self, ctr_id):
+		with self.lock:
+			name = self.names.pop(ctr_id, None)
+			if name is not None:
+				self.ctrs.pop(name, None)
+
+	def handle_event(self, event):
+		action = event.get("Action", event.get("status", ""))
+		ctr_id = event.get("Actor", {}).get("ID", event.get("id"))
+		if ctr_id is None or action not in self.watched_events:
+			return
+		logging.debug("Container event: %s %s" % (action, ctr_id[:12]))
+		if action == "destroy":
+			self.discard(ctr_id)
+		else:
+			ctr = self.fetch(ctr_id)
+			if ctr is None:
+				self.discard(ctr_id)
+			else:
+				self.upsert(ctr)
+		self.notify_event(event)
+		self.notify()
+
+	# Event Loop
+
+	def subscribe(self):
+		# Subscribe before resyncing so no event falls in the gap
+		self.stream = self.events()
+		self.resync()
+
+	def watch(self):
+		while not self.stopped.is_set():
+			try:
+				# start() has already subscribed for the first pass
+				if self.stream is None:
+					self.subscribe()
+				for event in self.stream:
+					if self.stopped.is_set():
+						break
+					self.handle_event(event)
+				logging.info("Docker events stream closed")
+			except Exception as e:
+				logging.error("Docker events stream failed: %s" % e)
+			self.stream = None
+			self.synced = False
+			self.stopped.wait(self.resync_delay)
+
+	def start(self):
+		# Seeds the registry before returning, from the same subscription the
+		# watcher goes on to read. One watcher per registry, however many
+		# owners ask for it
+		with self.lock:
+			if self.thread is not None and self.thread.is_alive():
+				return
+			self.subscribe()
+			self.thread = threading.Thread(target=self.watch)
+			self.thread.daemon = True
+			self.thread.start()
+
+	def stop(self):
+		self.stopped.set()
+		if self.stream is not None and hasattr(self.stream, "close"):
+			try:
+				self.stream.close()
+			except Exception as e:
+				logging.debug("Failed to close events stream: %s" % e)
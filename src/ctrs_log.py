@@ -0,0 +1,120 @@
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+
+
+# Persistence for containers.json. Changes mark their entry dirty and are
+# written in one batch after flush_interval seconds (and at exit). Writes go
+# through a temp file and a rename, and are skipped if nothing changed.
+# Writes are timed into call_stats (a CallStats) when one is given.
+class ContainersLog:
+
+	def __init__(self, path, flush_interval=2, call_stats=None):
+		self.path = path
+		self.flush_interval = flush_interval
+		self.call_stats = call_stats
+		self.entries = {}
+		self.dirty = set()
+		self.last_written = None
+		self.timer = None
+		self.lock = threading.RLock()
+		atexit.register(self.flush)
+
+	# Reads
+
+	def __contains__(self, name):
+		with self.lock:
+			return name in self.entries
+
+	def __getitem__(self, name):
+		with self.lock:
+			return dict(self.entries[name])
+
+	def get(self, name, key, default=None):
+		with self.lock:
+			return self.entries.get(name, {}).get(key, default)
+
+	# Updates
+
+	def add(self, name, entry):
+		with self.lock:
+			if self.entries.get(name) == entry:
+				return
+			self.entries[name] = dict(entry)
+			self.mark_dirty(name)
+
+	def set(self, name, key, value):
+		with self.lock:
+			entry = self.entries.setdefault(name, {"PROJECT_ID": None, "USER": "-"})
+			if entry.get(key) == value:
+				return
+			entry[key] = value
+			self.mark_dirty(name)
+
+	def pop(self, name):
+		with self.lock:
+			if self.entries.pop(name, None) is not None:
+				self.mark_dirty(name)
+
+	def mark_dirty(self, name):
+		self.dirty.add(name)
+		if self.timer is None:
+			self.timer = threading.Timer(self.flush_interval, self.flush)
+			self.timer.daemon = True
+			self.timer.start()
+
+	# File Handling
+
+	def load(self):
+		with self.lock:
+			with open(self.path, 'r') as logfile:
+				content = logfile.read()
+			self.entries = json.loads(content) if content.strip() else {}
+			self.last_written = content
+			self.dirty.clear()
+
+	def flush(self):
+		with self.lock:
+			if self.timer is not None:
+				self.timer.cancel()
+				self.timer = None
+			if not self.dirty:
+				return
+			content = json.dumps(self.entries, sort_keys=True)
+			logging.debug(
+				"Flushing containers log: %s dirty entries" % len(self.dirty)
+			)
+			self.dirty.clear()
+			if content == self.last_written:
+				return
+			if self.call_stats is not None:
+				with self.call_stats.timed("fs.containers_log"):
+					self.write(content)
+			else:
+				self.write(content)
+			self.last_written = content
+
+	def write(self, content):
+		directory = os.path.dirname(os.path.abspath(self.path))
+		fd, tmp_path = tempfile.mkstemp(
+			prefix=".containers.", suffix=".tmp", dir=directory
+		)
+		try:
+			with os.fdopen(fd, 'w') as tmp_file:
+				tmp_file.write(content)
+				tmp_file.flush()
+				os.fsync(tmp_file.fileno())
+			if hasattr(os, "replace"):
+				os.replace(tmp_path, self.path)
+			else:
+				# Python 2 on Windows won't rename over an existing file
+				if os.name == "nt" and os.path.exists(self.path):
+					os.remove(self.path)
+				os.rename(tmp_path, self.path)
+		except Exception:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			raise
@@ -3,18 +3,53 @@ from io import BytesIO
 import re
 import json
 import os
-from haikunator import Haikunator
+import hashlib
+import socket
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+try:
+	from urlparse import urlparse
+except ImportError:
+	from urllib.parse import urlparse
+try:
+	from Queue import Queue, Empty
+except ImportError:
+	from queue import Queue, Empty
+from src.ctr_registry import ContainerRegistry
+from src.ctrs_log import ContainersLog
+from src.credentials import CredentialsCache
+from src.image_build import BuildProgress, BuildCancelled
+from src.call_stats import CallStats
+from src.standby_pool import StandbyPool
+from src.idle_manager import IdleManager
 
 
 class DataLabAPI:
 
 	# Global Variables
+	remote = False
 	docker = None
 	cli = None
 	cli_timeout = None
 	os_type = None
 	ctrs = None
 	ctrs_log = None
+	registry = None
+	last_query_time = None
+	metadata_pool = None
+	metadata_timeout = None
+	ctr_env_cache = None
+	ctrs_log_interval = None
+	credentials = None
+	digest_cache = None
+	pull_base_image = None
+	port_range = None
+	batch_pool = None
+	stop_timeout = None
+	call_stats = None
+	standby_pool = None
+	idle_manager = None
 
 	# Container Status Dict
 	ctr_status_dict = {
@@ -25,16 +60,19 @@ class DataLabAPI:
 		u"restarting": "Restarting..."
 	}
 
+	# Seconds between checks for a cancelled image build
+	build_cancel_interval = 0.25
+
 	# Container Log Function
 
 	def load_containers_log(self):
-		with open(self.ctrs_logfile, 'r') as logfile:
-			ctrs_log = json.load(logfile)
-			self.ctrs_log = ctrs_log
+		self.ctrs_log = ContainersLog(
+			self.ctrs_logfile, self.ctrs_log_interval, self.call_stats
+		)
+		self.ctrs_log.load()
 
 	def save_containers_log(self):
-		with open(self.ctrs_logfile, 'w') as logfile:
-			json.dump(self.ctrs_log, logfile)
+		self.ctrs_log.flush()
 
 	# Drive Functions
 	
@@ -59,27 +97,107 @@ class DataLabAPI:
 		local = os.path.join(os.getcwd(), local, "Dockerfile")
 		latest = os.path.join(latest, "Dockerfile")
 		with open(local, 'r') as local_file:
-			local_content = local_file.readlines()
+			local_content = local_file.read()
 		with open(latest, 'r') as latest_file:
-			latest_content = latest_file.readlines()	
-		for i, val in enumerate(local_content):
-			if local_content[i] != latest_content[i]:
-				return False
-		return True
+			latest_content = latest_file.read()
+		return local_content == latest_content
+
+	def load_digest_cache(self):
+		try:
+			with open(self.digest_cachefile, 'r') as cachefile:
+				self.digest_cache = json.load(cachefile)
+		except (IOError, OSError, ValueError):
+			self.digest_cache = {}
+
+	def save_digest_cache(self):
+		try:
+			with open(self.digest_cachefile, 'w') as cachefile:
+				json.dump(self.digest_cache, cachefile)
+		except (IOError, OSError) as e:
+			logging.error("Failed to save Dockerfile digest cache: %s" % e)
+
+	def dockerfile_digest(self, path):
+		# The shared Dockerfile sits on a network drive, so only re-hash it
+		# when its mtime or size has moved
+		dockerfile = os.path.abspath(os.path.join(path, "Dockerfile"))
+		stat = os.stat(dockerfile)
+		key = [stat.st_mtime, stat.st_size]
+		with self.digest_lock:
+			cached = self.digest_cache.get(dockerfile)
+			if cached is not None and cached["key"] == key:
+				return cached["digest"]
+			digest = hashlib.sha256()
+			with open(dockerfile, 'rb') as contents:
+				for chunk in iter(lambda: contents.read(65536), b""):
+					digest.update(chunk)
+			self.digest_cache[dockerfile] = {
+				"key": key,
+				"digest": digest.hexdigest()
+			}
+			self.save_digest_cache()
+			return digest.hexdigest()
+
+	def check_for_update(self, local, latest, image_info=None):
+		# image_info is a get_image_info result the caller already holds
+		if image_info is None:
+			image_info = self.get_image_info()
+		image_digest = image_info["digest"] if image_info else None
+		if image_digest is None:
+			# Images built before digest labels fall back to comparing files
+			logging.debug("Image has no Dockerfile digest label")
+			return not self.compare_dockerfiles(local, latest)
+		return image_digest != self.dockerfile_digest(latest)
 
 	# Container Functions
 	
 	def gen_ctr_name(self):
+		# Imported here so headless use doesn't pay for it unless needed
+		from haikunator import Haikunator
 		return Haikunator().haikunate(delimiter="_",token_length=0)
 
+	def query_datalab_ctrs(self, filters=None):
+		# Label filter is applied by the daemon and sparse=True skips the
+		# per-container inspect, so we only pay for the list payload
+		query_filters = {"label": "dll_image=datalab"}
+		query_filters.update(filters or {})
+		start = time.time()
+		with self.call_stats.timed("containers.list"):
+			ctrs = self.cli.containers.list(
+				all=True, sparse=True, filters=query_filters
+			)
+		self.last_query_time = time.time() - start
+		logging.debug(
+			"Listed %s DataLab containers in %.3fs"
+			% (len(ctrs), self.last_query_time)
+		)
+		return ctrs
+
+	def query_datalab_ctr(self, ctr_id):
+		ctrs = self.query_datalab_ctrs({"id": ctr_id})
+		return ctrs[0] if ctrs else None
+
+	def subscribe_ctr_events(self):
+		# Only the subscription is timed; the stream itself is long-lived
+		with self.call_stats.timed("events"):
+			return self.cli.events(
+				decode=True,
+				filters={
+					"type": "container",
+					"label": "dll_image=datalab",
+					"event": ContainerRegistry.watched_events
+				}
+			)
+
 	def get_datalab_ctrs(self):
-		ctrs = self.cli.containers.list(all=True)
+		# Standby pool spares aren't anyone's containers until claimed
 		return [
-			ctr for ctr in ctrs
-			if (u"dll_image" in ctr.attrs[u"Config"][u"Labels"]
-				and self.get_ctr_image(ctr) == u"datalab")
+			ctr for ctr in self.registry.list()
+			if not StandbyPool.is_member(self.get_ctr_name(ctr))
 		]
 
+	def get_ctr_by_name(self, name):
+		return self.registry.get(name)
+
 	def get_running_ctrs(self):
 		datalab_ctrs = self.get_datalab_ctrs()
 		return [
@@ -90,24 +208,154 @@ class DataLabAPI:
 	def is_ctr_running(self, ctr):
 		return self.get_ctr_state(ctr) == u"running"
 
-	@staticmethod
-	def start_container(ctr):
-		ctr.start()
+	# Paused containers are still up: they keep their port and kernels
+	def get_up_ctrs(self):
+		return [ctr for ctr in self.get_datalab_ctrs() if self.is_ctr_up(ctr)]
 
-	@staticmethod
-	def stop_container(ctr):
-		ctr.stop()
+	def is_ctr_up(self, ctr):
+		return self.get_ctr_state(ctr) in [u"running", u"paused"]
+
+	def start_container(self, ctr):
+		with self.call_stats.timed("container.start"):
+			ctr.start()
+
+	def stop_container(self, ctr):
+		# The daemon won't signal a paused container
+		self.wake_container(ctr)
+		with self.call_stats.timed("container.stop"):
+			ctr.stop(timeout=self.stop_timeout)
+
+	def restart_container(self, ctr):
+		self.wake_container(ctr)
+		with self.call_stats.timed("container.restart"):
+			ctr.restart(timeout=self.stop_timeout)
+
+	def pause_container(self, ctr):
+		with self.call_stats.timed("container.pause"):
+			ctr.pause()
+
+	def unpause_container(self, ctr):
+		with self.call_stats.timed("container.unpause"):
+			ctr.unpause()
+
+	def wake_container(self, ctr):
+		# Unpauses a container paused for idleness; True if it was paused
+		if self.get_ctr_state(ctr) != u"paused":
+			return False
+		try:
+			self.unpause_container(ctr)
+		except Exception as e:
+			logging.error(
+				"Failed to unpause %s: %s" % (self.get_ctr_name(ctr), e)
+			)
+			return False
+		logging.info("Unpaused %s" % self.get_ctr_name(ctr))
+		return True
+
+	def stream_ctr_stats(self, ctr):
+		# Only the subscription is timed; samples then arrive once a second
+		with self.call_stats.timed("stats"):
+			return ctr.stats(decode=True, stream=True)
+
+	def rename_container(self, ctr, name):
+		with self.call_stats.timed("container.rename"):
+			ctr.rename(name)
+
+	def stop_all_containers(self):
+		return self.run_batch(self.stop_container, self.get_up_ctrs())
 
-	def remove_container(self, ctr):
+	def remove_container(self, ctr, force=False):
+		# force skips the separate stop and kills a running container
 		ctr_name = self.get_ctr_name(ctr)
-		ctr.remove()
-		self.ctrs_log.pop(ctr_name, None)
-		self.save_containers_log()
+		with self.call_stats.timed("container.remove"):
+			ctr.remove(force=force)
+		self.registry.discard(ctr.id)
+		self.credentials.invalidate(self.ctrs_log.get(ctr_name, "DRIVE", ctr_name))
+		self.ctrs_log.pop(ctr_name)
+
+	def force_remove_container(self, ctr):
+		self.remove_container(ctr, force=True)
+
+	def get_claimed_ports(self):
+		ports = set()
+		for ctr in self.registry.list():
+			try:
+				port = urlparse(self.get_ctr_address(ctr)).port
+			except Exception as e:
+				continue
+			if port is not None:
+				ports.add(port)
+		return ports
+
+	@staticmethod
+	def is_port_free(port):
+		sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		try:
+			sock.bind(("127.0.0.1", port))
+			return True
+		except socket.error:
+			return False
+		finally:
+			sock.close()
+
+	def allocate_port(self):
+		# Ports are claimed by other DataLab containers (running or not, since
+		# a stopped one will want its port back) or by anything else bound on
+		# the host
+		claimed = self.get_claimed_ports()
+		for port in range(self.port_range[0], self.port_range[1] + 1):
+			if port not in claimed and self.is_port_free(port):
+				return port
+		raise Exception(
+			"No free port in range %s-%s" % tuple(self.port_range)
+		)
+
+	def run_batch(self, operation, ctrs):
+		# Runs operation on every container across the batch pool and returns
+		# {name: None on success, or the exception raised}
+		futures = {}
+		for ctr in ctrs:
+			futures[self.batch_pool.submit(operation, ctr)] = self.get_ctr_name(ctr)
+		results = {}
+		for future in as_completed(futures):
+			name = futures[future]
+			try:
+				future.result()
+				results[name] = None
+			except Exception as e:
+				logging.error("Batch operation failed on %s: %s" % (name, e))
+				results[name] = e
+		return results
 
 	def create_container(
 			self, name, project_id, deployment, gateway, local_drive, drives,
-			local_port=8081
+			local_port=None
 	):
+		# A Local create is served from the standby pool when a spare fits
+		if local_port is None and not StandbyPool.is_member(name):
+			ctr = self.standby_pool.claim(
+				name, project_id, deployment, gateway, local_drive, drives
+			)
+			if ctr is not None:
+				return ctr
+		# Held until the new container is in the registry, so two creates
+		# can't pick the same port
+		with self.port_lock:
+			ctr = self.create_container_locked(
+				name, project_id, deployment, gateway, local_drive, drives,
+				local_port
+			)
+			created = self.query_datalab_ctr(ctr.id)
+			if created is not None:
+				self.registry.upsert(created)
+		return ctr
+
+	def create_container_locked(
+			self, name, project_id, deployment, gateway, local_drive, drives,
+			local_port
+	):
+		if local_port is None:
+			local_port = self.allocate_port()
 		binds = {}
 		if name == "":
 			name = self.gen_ctr_name()
@@ -155,38 +403,78 @@ class DataLabAPI:
 			kwargs["name"] = name
 		if gateway:
 			kwargs["environment"]["GATEWAY_VM"] = gateway
-		ctr = self.cli.containers.create(**kwargs)
+		with self.call_stats.timed("containers.create"):
+			ctr = self.cli.containers.create(**kwargs)
 		# Alter startup path
 		datalab_settings = os.path.join(container_drive, ".config","settings.json")
 		if not os.path.exists(os.path.dirname(datalab_settings)):
 			os.makedirs(os.path.dirname(datalab_settings))
 		with open(datalab_settings, 'w') as f:
 			f.write('{"startuppath":"/tree/datalab/workspace"}')
-		self.ctrs_log[name] = {
+		self.ctrs_log.add(name, {
 			"PROJECT_ID": project_id,
 			"USER": "-"
-		}
-		self.save_containers_log()
+		})
+		# The drive may be left over from an earlier container of this name
+		self.credentials.invalidate(name)
 		return ctr
 
-	def get_ctr_project(self, ctr):
-		if self.is_ctr_running(ctr):
+	def get_ctr_env(self, ctr):
+		# The environment is fixed at create time, so one inspect per container
+		# is enough; sparse list payloads don't carry it
+		with self.ctr_env_lock:
+			env = self.ctr_env_cache.get(ctr.id)
+		if env is None:
+			if u"Config" in ctr.attrs:
+				attrs = ctr.attrs
+			else:
+				with self.call_stats.timed("inspect_container"):
+					attrs = self.cli.api.inspect_container(ctr.id)
+			env = dict(
+				item.split("=", 1) for item in (attrs[u"Config"][u"Env"] or [])
+				if "=" in item
+			)
+			with self.ctr_env_lock:
+				self.ctr_env_cache[ctr.id] = env
+		return env
+
+	def exec_ctr_project(self, ctr):
+		with self.call_stats.timed("exec_run"):
+			result = ctr.exec_run("bash -c printenv", tty=True)
+		# docker-py >= 3 returns an ExecResult rather than the raw output
+		output = getattr(result, "output", result)
+		if isinstance(output, bytes):
+			output = output.decode("utf-8", "replace")
+		project_raw = re.search(r"^PROJECT_ID=(.*)$", output, re.MULTILINE)
+		return (
+			project_raw
+			.groups()[0]
+			.replace('\r', '')
+			.replace('\n', '')
+		)
+
+	def get_ctr_project(self, ctr, live=False):
+		# Live lookups exec into the container, so only run them on request
+		if live and self.is_ctr_running(ctr):
 			try:
-				# TODO: Look for a way of updating project if it changes?
-				# Raising here to break previous method
-				env = ctr.exec_run("bash -c printenv", tty=True)
-				project_raw = re.search(r"^PROJECT_ID=(.*)$", env, re.MULTILINE)
-				project_clean = (
-					project_raw
-					.groups()[0]
-					.replace('\r', '')
-					.replace('\n', '')
-				)
-				self.ctrs_log[self.get_ctr_name(ctr)]["PROJECT_ID"] = project_clean
-				self.save_containers_log()
-				return project_clean
+				# Claimed standby containers have an empty PROJECT_ID
+				project_clean = self.exec_ctr_project(ctr)
+				if project_clean:
+					with self.ctr_env_lock:
+						self.get_ctr_env(ctr)["PROJECT_ID"] = project_clean
+					self.ctrs_log.set(
+						self.get_ctr_name(ctr), "PROJECT_ID", project_clean
+					)
+					return project_clean
 			except Exception as e:
-				logging.info("Failed to extract Project ID")
+				logging.info("Failed to extract live Project ID")
+		try:
+			project_id = self.get_ctr_env(ctr).get("PROJECT_ID")
+			if project_id:
+				self.ctrs_log.set(self.get_ctr_name(ctr), "PROJECT_ID", project_id)
+				return project_id
+		except Exception as e:
+			logging.info("Failed to read Project ID from inspect data")
 		try:
 			last_project = self.ctrs_log[self.get_ctr_name(ctr)]["PROJECT_ID"]
 			if last_project is None:
@@ -197,77 +485,131 @@ class DataLabAPI:
 			logging.error("Failed to load previous Project ID")
 			return "-"
 
+	def refresh_ctr_projects(self):
+		for ctr in self.get_running_ctrs():
+			self.get_ctr_project(ctr, live=True)
+
 	def get_ctr_user(self, ctr):
-		credentials_file = os.path.join(
-			os.path.abspath(self.local_drive),
-			"containers",
-			self.get_ctr_name(ctr),
-			".config",
-			"credentials"
-		)
-		if os.path.exists(credentials_file):
-			try:
-				ctr_user = None
-				with open(credentials_file, 'r') as file:
-					creds = json.load(file)
-					try:
-						ctr_user = creds['data'][0]['key']['account']
-					except Exception as e:
-						logging.debug("Cannot pull user from credentials file")
-				if ctr_user is None:
-					logging.error("Cannot pull ctr_user from credentials file")
-					self.ctrs_log[self.get_ctr_name(ctr)]["USER"] = "-"
-					self.save_containers_log()
-					return "-"
-				self.ctrs_log[self.get_ctr_name(ctr)]["USER"] = ctr_user
-				self.save_containers_log()
+		ctr_name = self.get_ctr_name(ctr)
+		try:
+			# Claimed standby containers keep the drive named after the spare
+			drive_name = self.ctrs_log.get(ctr_name, "DRIVE", ctr_name)
+			with self.call_stats.timed("fs.credentials"):
+				ctr_user = self.credentials.get_user(drive_name)
+			if ctr_user is not None:
+				self.ctrs_log.set(ctr_name, "USER", ctr_user)
 				return ctr_user
-			except Exception as e:
-				logging.error("Failed to extract User Account")
+		except Exception as e:
+			logging.error("Failed to extract User Account")
 		try:
-			return self.ctrs_log[self.get_ctr_name(ctr)]["USER"]
+			return self.ctrs_log[ctr_name]["USER"]
 		except Exception as e:
 			logging.error("Failed to load previous User Account")
 			return "-"
 
+	# Container attrs come either from a full inspect or from the sparse list
+	# payload, which uses "Names"/"Labels" and a plain "State" string
+
 	@staticmethod
 	def get_ctr_name(ctr):
+		if u"Names" in ctr.attrs:
+			return ctr.attrs[u"Names"][0].lstrip(u"/")
 		return ctr.name
 
 	@staticmethod
-	def get_ctr_image(ctr):
-		return ctr.attrs[u"Config"][u"Labels"][u"dll_image"]
+	def get_ctr_labels(ctr):
+		if u"Labels" in ctr.attrs:
+			return ctr.attrs[u"Labels"] or {}
+		return ctr.attrs[u"Config"][u"Labels"] or {}
 
-	@staticmethod
-	def get_ctr_version(ctr):
-		return ctr.attrs[u"Config"][u"Labels"][u"dll_version"]
+	@classmethod
+	def get_ctr_image(cls, ctr):
+		return cls.get_ctr_labels(ctr)[u"dll_image"]
 
-	@staticmethod
-	def get_ctr_deployment(ctr):
-		return ctr.attrs[u"Config"][u"Labels"][u"dll_deployment"]
+	@classmethod
+	def get_ctr_version(cls, ctr):
+		return cls.get_ctr_labels(ctr)[u"dll_version"]
 
-	@staticmethod
-	def get_ctr_address(ctr):
-		return ctr.attrs[u"Config"][u"Labels"][u"dll_address"]
+	@classmethod
+	def get_ctr_deployment(cls, ctr):
+		return cls.get_ctr_labels(ctr)[u"dll_deployment"]
 
-	@staticmethod
-	def get_ctr_machine_info(ctr):
-		return ctr.attrs[u"Config"][u"Labels"][u"dll_machine_info"]
+	@classmethod
+	def get_ctr_address(cls, ctr):
+		return cls.get_ctr_labels(ctr)[u"dll_address"]
+
+	@classmethod
+	def get_ctr_machine_info(cls, ctr):
+		return cls.get_ctr_labels(ctr)[u"dll_machine_info"]
 
 	@staticmethod
 	def get_ctr_state(ctr):
-		return ctr.attrs[u"State"][u"Status"]
+		if isinstance(ctr.attrs[u"State"], dict):
+			return ctr.attrs[u"State"][u"Status"]
+		return ctr.attrs[u"State"]
+
+	def get_ctr_metadata(self, ctr):
+		try:
+			return self.get_ctr_project(ctr), self.get_ctr_user(ctr)
+		finally:
+			with self.metadata_lock:
+				self.metadata_in_flight.discard(ctr.id)
+
+	def gather_ctrs_metadata(self, ctrs):
+		# Fan the slow lookups (exec, credentials file) out across the pool.
+		# One deadline, metadata_timeout seconds from submission, covers the
+		# whole batch: anything not finished by then, queued or running, is
+		# reported as unknown. A hung lookup keeps its worker, so a container
+		# whose previous lookup is still in flight isn't submitted again
+		deadline = time.time() + self.metadata_timeout
+		pending = {}
+		metadata = {}
+		for ctr in ctrs:
+			with self.metadata_lock:
+				in_flight = ctr.id in self.metadata_in_flight
+				self.metadata_in_flight.add(ctr.id)
+			if in_flight:
+				logging.error(
+					"Still gathering metadata for %s" % self.get_ctr_name(ctr)
+				)
+				metadata[ctr.id] = ("unknown", "unknown")
+				continue
+			pending[self.metadata_pool.submit(self.get_ctr_metadata, ctr)] = ctr
+		done, not_done = wait(
+			list(pending), timeout=max(deadline - time.time(), 0)
+		)
+		for future in done:
+			ctr = pending[future]
+			try:
+				metadata[ctr.id] = future.result()
+			except Exception as e:
+				logging.error(
+					"Failed to gather metadata for %s: %s"
+					% (self.get_ctr_name(ctr), e)
+				)
+				metadata[ctr.id] = ("unknown", "unknown")
+		for future in not_done:
+			ctr = pending[future]
+			logging.error(
+				"Timed out gathering metadata for %s" % self.get_ctr_name(ctr)
+			)
+			# Lookups that never started are dropped; running ones finish alone
+			if future.cancel():
+				with self.metadata_lock:
+					self.metadata_in_flight.discard(ctr.id)
+			metadata[ctr.id] = ("unknown", "unknown")
+		return metadata
 
 	def get_ctrs_info(self):
 		datalab_ctrs = self.get_datalab_ctrs()
+		metadata = self.gather_ctrs_metadata(datalab_ctrs)
 		ctrs_info = []
 		for ctr in datalab_ctrs:
 			ctr_info = {}
 			ctr_state = self.get_ctr_state(ctr)
 			ctr_info["Status"] = self.ctr_status_dict[ctr_state]
 			ctr_info["Name"] = self.get_ctr_name(ctr)
-			ctr_info["Project ID"] = self.get_ctr_project(ctr)
-			ctr_info["User"] = self.get_ctr_user(ctr)
+			ctr_info["Project ID"], ctr_info["User"] = metadata[ctr.id]
 			ctr_info["Version"] = self.get_ctr_version(ctr)
 			ctr_info["Deployment"] = self.get_ctr_deployment(ctr)
 			ctr_info["Address"] = self.get_ctr_address(ctr)
@@ -277,66 +619,292 @@ class DataLabAPI:
 
 	# Image Functions
 
+	def get_image_info(self, tag="dll_datalab:latest"):
+		# One inspect of the tag, however many images the host holds. None
+		# if the tag doesn't exist
+		try:
+			with self.call_stats.timed("inspect_image"):
+				attrs = self.cli.api.inspect_image(tag)
+		except self.docker.errors.NotFound:
+			return None
+		labels = (attrs.get(u"Config") or {}).get(u"Labels") or {}
+		return {
+			"id": attrs[u"Id"],
+			"version": labels.get(u"dll_version"),
+			"digest": labels.get(u"dll_dockerfile_digest")
+		}
+
 	def check_image_loaded(self):
-		imgs = self.cli.images.list(all=True)
-		datalab_images = [img for img in imgs if u"dll_datalab:latest" in img.tags]
-		return True if len(datalab_images) > 0 else False
+		return self.get_image_info() is not None
+
+	def get_image_digest(self):
+		image_info = self.get_image_info()
+		return image_info["digest"] if image_info else None
+
+	def build_image(
+			self, path=None, fileobj=None, labels=None,
+			tag="dll_datalab:latest", progress=None, cancel=None
+	):
+		# Stream the low-level build output so we can report progress, and
+		# drop the connection on cancel, which ends the build. The timing
+		# covers the whole stream, not just the request
+		with self.call_stats.timed("build"):
+			return self.stream_build(path, fileobj, labels, tag, progress, cancel)
+
+	@staticmethod
+	def close_response(response):
+		# Shut the socket down rather than only closing it, so the read
+		# blocked on it returns and the daemon sees the client go
+		connection = getattr(getattr(response, "raw", None), "_connection", None)
+		sock = getattr(connection, "sock", None)
+		if sock is not None:
+			try:
+				sock.shutdown(socket.SHUT_RDWR)
+			except socket.error:
+				pass
+		response.close()
+
+	def stream_build(self, path, fileobj, labels, tag, progress, cancel):
+		# The low-level client is a requests session, and a response hook is
+		# the only way to the build's HTTP response. Hooks run on the thread
+		# making the request, which tells our response from other threads'
+		responses = []
+		caller = threading.current_thread()
+
+		def keep_response(response, *args, **kwargs):
+			if threading.current_thread() is caller:
+				responses.append(response)
+
+		hooks = getattr(self.cli.api, "hooks", {}).get("response")
+		if hooks is not None:
+			hooks.append(keep_response)
+		try:
+			stream = self.cli.api.build(
+				path=path,
+				fileobj=fileobj,
+				rm=True,
+				pull=self.pull_base_image,
+				tag=tag,
+				labels=labels,
+				decode=True
+			)
+		finally:
+			if hooks is not None:
+				hooks.remove(keep_response)
+		# Chunks are read on their own thread, so a quiet build (a long RUN
+		# step, a stalled pull) can still be cancelled
+		chunks = Queue()
+
+		def read():
+			try:
+				for chunk in stream:
+					chunks.put(chunk)
+				chunks.put(None)
+			except Exception as e:
+				chunks.put(e)
+
+		reader = threading.Thread(target=read)
+		reader.daemon = True
+		reader.start()
+		tracker = BuildProgress()
+		try:
+			while True:
+				if cancel is not None and cancel.is_set():
+					raise BuildCancelled("Image build cancelled")
+				try:
+					chunk = chunks.get(timeout=self.build_cancel_interval)
+				except Empty:
+					continue
+				if chunk is None:
+					break
+				if isinstance(chunk, Exception):
+					raise chunk
+				if "error" in chunk:
+					raise Exception(chunk["error"].strip())
+				message = tracker.update(chunk)
+				if message is not None:
+					logging.debug(message)
+					if progress is not None:
+						progress(message)
+		finally:
+			# Also how the reader is stopped on cancel or error
+			for response in responses:
+				self.close_response(response)
+		logging.debug(
+			"Built %s in %.1fs" % (tag, time.time() - tracker.start)
+		)
+		return tracker.image_id
 
-	def update_image(self, dockerfile):
+	def update_image(self, dockerfile, progress=None, cancel=None):
+		# Build under the staging tag so dll_datalab:latest stays usable for
+		# the whole build, then swap it in
 		logging.debug("Dockerfile used: " + dockerfile)
-		logging.debug("Building image as dll_datalab:latest")
-		self.cli.images.build(
+		logging.debug("Building image as dll_datalab:staging")
+		self.build_image(
 			path=dockerfile,
-			rm=True,
-			pull=True,
-			tag="dll_datalab:latest"
+			labels={"dll_dockerfile_digest": self.dockerfile_digest(dockerfile)},
+			tag="dll_datalab:staging",
+			progress=progress,
+			cancel=cancel
 		)
+		self.promote_image("staging")
 		logging.debug("Image successfully updated")
 
-	def pull_image(self, image_type, dockerfile=None):
+	def retag_image(self, source, target):
+		# Keep whatever target currently points at as "previous" for rollback.
+		# Each tag call is a single daemon operation, so latest always points
+		# at a complete image
+		with self.call_stats.timed("images.get"):
+			img = self.cli.images.get("dll_datalab:" + source)
+		try:
+			with self.call_stats.timed("images.get"):
+				current = self.cli.images.get("dll_datalab:" + target)
+			if current.id != img.id:
+				with self.call_stats.timed("image.tag"):
+					current.tag("dll_datalab", "previous")
+		except self.docker.errors.ImageNotFound:
+			pass
+		with self.call_stats.timed("image.tag"):
+			img.tag("dll_datalab", target)
+		logging.debug("Tagged dll_datalab:%s as dll_datalab:%s" % (source, target))
+		return img
+
+	def promote_image(self, source):
+		self.retag_image(source, "latest")
+		with self.call_stats.timed("images.remove"):
+			self.cli.images.remove("dll_datalab:" + source)
+		self.standby_pool.refill()
+
+	def prune_images(self, keep_versions=2):
+		# Keep the newest image of each of the keep_versions most recent
+		# dll_versions, anything still tagged (latest/previous/staging) and
+		# anything a DataLab container was created from. The low-level list
+		# skips the per-image inspect the high-level one makes
+		start = time.time()
+		with self.call_stats.timed("images"):
+			imgs = self.cli.api.images(filters={"label": "dll_image=datalab"})
+		in_use = set(
+			ctr.attrs.get(u"ImageID") for ctr in self.registry.list()
+		)
+		versions = []
+		removable = []
+		for img in sorted(imgs, key=lambda img: img[u"Created"], reverse=True):
+			version = (img.get(u"Labels") or {}).get(u"dll_version")
+			tags = [
+				tag for tag in (img.get(u"RepoTags") or [])
+				if tag != u"<none>:<none>"
+			]
+			if version not in versions and len(versions) < keep_versions:
+				versions.append(version)
+			elif not tags and img[u"Id"] not in in_use:
+				removable.append(img)
+		reclaimed = 0
+		removed = 0
+		for img in removable:
+			try:
+				with self.call_stats.timed("remove_image"):
+					self.cli.api.remove_image(img[u"Id"])
+				reclaimed += img.get(u"Size", 0)
+				removed += 1
+			except self.docker.errors.APIError as e:
+				logging.debug("Could not remove image %s: %s" % (img[u"Id"][:19], e))
+		try:
+			with self.call_stats.timed("prune_images"):
+				result = self.cli.api.prune_images(
+					filters={"dangling": True, "label": "dll_image=datalab"}
+				)
+			reclaimed += result.get(u"SpaceReclaimed") or 0
+		except self.docker.errors.APIError as e:
+			logging.debug("Could not prune dangling images: %s" % e)
+		logging.info(
+			"Pruned %s DataLab images, reclaimed %s bytes in %.2fs"
+			% (removed, reclaimed, time.time() - start)
+		)
+		return removed, reclaimed
+
+	def rollback_image(self):
+		# Swaps latest and previous, so a second rollback undoes the first
+		img = self.retag_image("previous", "latest")
+		self.standby_pool.refill()
+		return img
+
+	def pull_image(self, image_type, dockerfile=None, progress=None, cancel=None):
 		try:
 			logging.debug("Building Image of type: " + image_type)
-			if image_type is "Base":
+			if image_type == "Base":
 				dockerfile_str = (
 					"# Base Image\nFROM gcr.io/cloud-datalab/datalab:local"
 					"\nLABEL \"dll_image\"=\"datalab\""
 					"\nLABEL\"LABEL\"dll_version\"=\"base\""
 				)
-				dockerfile = BytesIO(dockerfile_str)
+				dockerfile = BytesIO(dockerfile_str.encode("utf-8"))
 				logging.debug("Building image as dll_datalab:latest")
-				self.cli.images.build(
-					path=dockerfile,
-					rm=True,
-					pull=True,
-					tag="dll_datalab:latest"
+				self.build_image(
+					fileobj=dockerfile,
+					labels={
+						"dll_dockerfile_digest":
+							hashlib.sha256(dockerfile_str.encode("utf-8")).hexdigest()
+					},
+					progress=progress,
+					cancel=cancel
 				)
 				logging.debug("Image successfully built")
-				# TODO: No errors raised by cli.build. We should check this is true
+				self.standby_pool.refill()
 				return dockerfile_str
 			else:
 				logging.debug("Dockerfile used: " + dockerfile)
 				logging.debug("Building image as dll_datalab:latest")
-				self.cli.images.build(
+				self.build_image(
 					path=dockerfile,
-					rm=True,
-					pull=True,
-					tag="dll_datalab:latest"
+					labels={"dll_dockerfile_digest": self.dockerfile_digest(dockerfile)},
+					progress=progress,
+					cancel=cancel
 				)
-				# TODO: No errors raised by cli.build. We should check this is true
 				logging.debug("Image successfully built")
+				self.standby_pool.refill()
 				with open(dockerfile+'Dockerfile', 'r') as contents:
 					return contents.read()
+		except BuildCancelled:
+			raise
 		except Exception as e:
-			logging.error("Failed to build Image")
+			logging.error("Failed to build Image: %s" % e)
 			return False
 
-	def __init__(self, os_type, cli_timeout, ctrs_logfile, local_drive):
+	def __init__(
+			self, os_type, cli_timeout, ctrs_logfile, local_drive,
+			metadata_workers=8, metadata_timeout=5, ctrs_log_interval=2,
+			pull_base_image=True, port_range=(8081, 8180), batch_workers=16,
+			stop_timeout=10, watch_events=True, standby_pool_size=0,
+			standby_pool_warm=False, drives=(), idle_pause_after=0,
+			idle_cpu_percent=1.0, idle_network_rate=2048
+	):
 		logging.info("Instantiating DataLab API Object...")
 		# Globalize passed variables
 		self.cli_timeout = cli_timeout
 		self.os_type = os_type
 		self.ctrs_logfile = ctrs_logfile
+		self.ctrs_log_interval = ctrs_log_interval
+		self.pull_base_image = pull_base_image
+		self.port_range = port_range
+		self.stop_timeout = stop_timeout
+		self.port_lock = threading.Lock()
+		self.digest_cachefile = os.path.join(
+			os.path.dirname(os.path.abspath(ctrs_logfile)), ".dockerfile_digests.json"
+		)
+		self.digest_lock = threading.Lock()
+		self.load_digest_cache()
 		self.local_drive = local_drive
+		self.credentials = CredentialsCache(
+			os.path.join(os.path.abspath(self.local_drive), "containers")
+		)
+		self.metadata_timeout = metadata_timeout
+		self.metadata_pool = ThreadPoolExecutor(max_workers=metadata_workers)
+		self.metadata_lock = threading.Lock()
+		self.metadata_in_flight = set()
+		self.batch_pool = ThreadPoolExecutor(max_workers=batch_workers)
+		self.ctr_env_lock = threading.RLock()
+		self.ctr_env_cache = {}
+		self.call_stats = CallStats()
 		self.load_containers_log()
 		# Attempt import of docker library
 		logging.debug("Importing Docker Python API Module...")
@@ -354,4 +922,68 @@ class DataLabAPI:
 			)
 		except Exception as e:
 			raise Exception("Failed to create Docker Client Object")
+		# Seed the container registry, then keep it current from events
+		logging.debug("Seeding Container Registry")
+		self.registry = ContainerRegistry(
+			seed=self.query_datalab_ctrs,
+			fetch=self.query_datalab_ctr,
+			events=self.subscribe_ctr_events,
+			get_name=self.get_ctr_name
+		)
+		if watch_events:
+			self.registry.start()
+		else:
+			self.registry.resync()
+		# Spares are created with the shared drives from settings; filling
+		# only begins once the owner calls standby_pool.start()
+		self.standby_pool = StandbyPool(
+			self, standby_pool_size, drives, standby_pool_warm
+		)
+		# Likewise idle pausing, which needs the events watcher running
+		self.idle_manager = IdleManager(
+			self, idle_pause_after, idle_cpu_percent, idle_network_rate
+		)
 		# Okay, we're ready to go!
+
+	# Settings keys passed on to the constructor, as {setting: argument};
+	# any left out of the settings take the constructor's defaults
+	settings_arguments = {
+		"metadata_workers": "metadata_workers",
+		"metadata_timeout": "metadata_timeout",
+		"containers_log_interval": "ctrs_log_interval",
+		"pull_base_image": "pull_base_image",
+		"port_range": "port_range",
+		"batch_workers": "batch_workers",
+		"stop_timeout": "stop_timeout",
+		"standby_pool_size": "standby_pool_size",
+		"standby_pool_warm": "standby_pool_warm",
+		"drives": "drives",
+		"idle_pause_after": "idle_pause_after",
+		"idle_cpu_percent": "idle_cpu_percent",
+		"idle_network_rate": "idle_network_rate"
+	}
+
+	@classmethod
+	def from_settings(cls, os_type, settings, ctrs_logfile, watch_events=True):
+		kwargs = dict(
+			(argument, settings[key])
+			for key, argument in cls.settings_arguments.items() if key in settings
+		)
+		return cls(
+			os_type, settings['docker_client_timeout'], ctrs_logfile,
+			settings['local_drive'], watch_events=watch_events, **kwargs
+		)
+
+	def get_call_stats(self):
+		return self.call_stats.summary()
+
+	def close(self):
+		if self.idle_manager is not None:
+			self.idle_manager.stop()
+		if self.standby_pool is not None:
+			self.standby_pool.stop()
+		if self.registry is not None:
+			self.registry.stop()
+		self.metadata_pool.shutdown(wait=False)
+		self.batch_pool.shutdown(wait=False)
+		self.save_containers_log()
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+
+
+# Pauses running DataLab containers that have been idle for pause_after
+# seconds. Each running container gets a thread reading its Docker stats
+# stream (one sample a second); a sample counts as activity if CPU use is
+# above cpu_percent or network traffic above network_rate bytes a second.
+# Pausing freezes the processes in place, so kernels keep their state and
+# are resumed with wake_container (as Open does). Watchers follow the
+# container registry, so they start and stop with the containers.
+class IdleManager:
+
+	def __init__(self, datalab, pause_after=0, cpu_percent=1.0, network_rate=2048):
+		self.datalab = datalab
+		self.pause_after = pause_after
+		self.cpu_percent = cpu_percent
+		self.network_rate = network_rate
+		self.started = False
+		self.watchers = {}
+		self.lock = threading.Lock()
+
+	def start(self):
+		if self.pause_after > 0 and not self.started:
+			self.started = True
+			self.datalab.registry.add_listener(self.sync)
+			self.sync()
+
+	def stop(self):
+		self.started = False
+		with self.lock:
+			for stopped in self.watchers.values():
+				stopped.set()
+			self.watchers = {}
+
+	def sync(self):
+		if not self.started:
+			return
+		running = dict(
+			(ctr.id, ctr) for ctr in self.datalab.get_datalab_ctrs()
+			if self.datalab.get_ctr_state(ctr) == u"running"
+		)
+		with self.lock:
+			for ctr_id in list(self.watchers):
+				if ctr_id not in running:
+					self.watchers.pop(ctr_id).set()
+			for ctr_id, ctr in running.items():
+				if ctr_id not in self.watchers:
+					stopped = threading.Event()
+					self.watchers[ctr_id] = stopped
+					thread = threading.Thread(target=self.watch, args=(ctr, stopped))
+					thread.daemon = True
+					thread.start()
+
+	# Samples
+
+	@staticmethod
+	def cpu_usage(sample):
+		# Percent of one CPU, as docker stats reports it
+		cpu = sample.get("cpu_stats") or {}
+		precpu = sample.get("precpu_stats") or {}
+		cpu_delta = (
+			(cpu.get("cpu_usage") or {}).get("total_usage", 0)
+			- (precpu.get("cpu_usage") or {}).get("total_usage", 0)
+		)
+		system_delta = (
+			cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+		)
+		if cpu_delta <= 0 or system_delta <= 0:
+			return 0.0
+		cpus = cpu.get("online_cpus") or len(
+			(cpu.get("cpu_usage") or {}).get("percpu_usage") or []
+		) or 1
+		return cpu_delta / float(system_delta) * cpus * 100
+
+	@staticmethod
+	def network_bytes(sample):
+		return sum(
+			network.get("rx_bytes", 0) + network.get("tx_bytes", 0)
+			for network in (sample.get("networks") or {}).values()
+		)
+
+	def watch(self, ctr, stopped):
+		name = self.datalab.get_ctr_name(ctr)
+		last_active = time.time()
+		last_sample = None
+		try:
+			for sample in self.datalab.stream_ctr_stats(ctr):
+				if stopped.is_set():
+					return
+				now = time.time()
+				received = self.network_bytes(sample)
+				if last_sample is not None:
+					rate = (received - last_sample[1]) / max(now - last_sample[0], 0.001)
+					if self.cpu_usage(sample) > self.cpu_percent or rate > self.network_rate:
+						last_active = now
+				last_sample = (now, received)
+				if now - last_active >= self.pause_after:
+					logging.info(
+						"Pausing %s after %ss without activity" % (name, self.pause_after)
+					)
+					self.datalab.pause_container(ctr)
+					return
+		except Exception as e:
+			logging.error("Stopped watching %s for idleness: %s" % (name, e))
+		finally:
+			with self.lock:
+				if self.watchers.get(ctr.id) is stopped:
+					self.watchers.pop(ctr.id)
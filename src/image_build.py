@@ -0,0 +1,68 @@
+import re
+import time
+
+
+class BuildCancelled(Exception):
+	pass
+
+
+# Turns the decoded JSON chunks of a streaming build into short progress
+# messages: the current Dockerfile step, and for base image pulls the layer
+# count, bytes fetched and throughput. Layer messages are throttled to one
+# per interval seconds so they don't flood the status bar.
+class BuildProgress:
+
+	step_regex = re.compile(r"^Step (\d+)/(\d+) : (.*)")
+
+	def __init__(self, interval=0.5):
+		self.interval = interval
+		self.start = time.time()
+		self.last_message = 0
+		self.step = None
+		self.layers = {}
+		self.image_id = None
+
+	@staticmethod
+	def format_bytes(count):
+		for unit in ["B", "KB", "MB", "GB"]:
+			if count < 1024 or unit == "GB":
+				return "%.1f %s" % (count, unit)
+			count = count / 1024.0
+
+	def throughput(self):
+		elapsed = max(time.time() - self.start, 0.001)
+		fetched = sum(current for current, total in self.layers.values())
+		return "%s at %s/s" % (
+			self.format_bytes(fetched), self.format_bytes(fetched / elapsed)
+		)
+
+	def update(self, chunk):
+		if "aux" in chunk and "ID" in chunk["aux"]:
+			self.image_id = chunk["aux"]["ID"]
+		if "stream" in chunk:
+			match = self.step_regex.match(chunk["stream"].strip())
+			if match is not None:
+				self.step = (int(match.group(1)), int(match.group(2)))
+				self.last_message = time.time()
+				return "Step %s/%s: %s" % (
+					self.step[0], self.step[1], match.group(3)[:80]
+				)
+			return None
+		if "id" in chunk and "progressDetail" in chunk:
+			detail = chunk["progressDetail"] or {}
+			current, total = self.layers.get(chunk["id"], (0, 0))
+			self.layers[chunk["id"]] = (
+				detail.get("current", current), detail.get("total", total)
+			)
+			if time.time() - self.last_message < self.interval:
+				return None
+			self.last_message = time.time()
+			done = len([
+				layer for layer, (current, total) in self.layers.items()
+				if total and current >= total
+			])
+			prefix = "Step %s/%s: " % self.step if self.step else ""
+			return "%sPulling layers %s/%s, %s" % (
+				prefix, done, len(self.layers), self.throughput()
+			)
+		return None
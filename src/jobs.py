@@ -0,0 +1,153 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+
+	def __init__(self, job_id, name, key, func, args, kwargs):
+		self.id = job_id
+		self.name = name
+		self.key = key
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs
+		self.status = "pending"
+		self.error = None
+		self.created = time.time()
+		self.started = None
+		self.finished = None
+		self.future = None
+		self.cancelled = threading.Event()
+
+	def in_flight(self):
+		return self.status in ["pending", "running"]
+
+	def describe(self):
+		return {
+			"id": self.id,
+			"name": self.name,
+			"key": self.key,
+			"status": self.status,
+			"error": self.error,
+			"duration": (
+				(self.finished or time.time()) - self.started
+				if self.started else None
+			)
+		}
+
+
+# Runs launcher jobs on a bounded pool. Jobs sharing a key (usually a
+# container name) run one at a time: later ones wait in a queue rather than
+# on a worker, and are submitted as the one before them finishes. Submitting
+# a job identical to one still in flight returns the existing job instead of
+# starting a duplicate (unless dedupe is off), and every job can be cancelled
+# and listed.
+class JobExecutor:
+
+	def __init__(self, max_workers=8, history=50):
+		self.pool = ThreadPoolExecutor(max_workers=max_workers)
+		self.history = history
+		self.jobs = OrderedDict()
+		# Jobs queued behind each busy key; a key is dropped once idle
+		self.waiting = {}
+		self.ids = itertools.count(1)
+		self.lock = threading.Lock()
+
+	def submit(
+			self, name, func, args=(), kwargs=None, key=None, cancellable=False,
+			dedupe=True
+	):
+		# cancellable jobs get the job's cancel Event as a "cancel" keyword
+		with self.lock:
+			if dedupe:
+				for job in self.jobs.values():
+					if job.name == name and job.key == key and job.in_flight():
+						logging.info("Ignoring duplicate job: %s %s" % (name, key or ""))
+						return job
+			job = Job(next(self.ids), name, key, func, args, dict(kwargs or {}))
+			if cancellable:
+				job.kwargs["cancel"] = job.cancelled
+			self.jobs[job.id] = job
+			self.trim()
+			if key is not None:
+				if key in self.waiting:
+					self.waiting[key].append(job)
+					return job
+				self.waiting[key] = deque()
+			self.start(job)
+		return job
+
+	def start(self, job):
+		job.future = self.pool.submit(self.run, job)
+
+	def advance(self, key):
+		# Starts the next job queued on key, or forgets the key
+		if key is None:
+			return
+		with self.lock:
+			waiting = self.waiting.get(key)
+			if waiting:
+				self.start(waiting.popleft())
+			else:
+				self.waiting.pop(key, None)
+
+	def run(self, job):
+		try:
+			if job.cancelled.is_set():
+				job.status = "cancelled"
+				return None
+			job.status = "running"
+			job.started = time.time()
+			logging.debug("Job %s started: %s %s" % (job.id, job.name, job.key or ""))
+			try:
+				result = job.func(*job.args, **job.kwargs)
+				job.status = "cancelled" if job.cancelled.is_set() else "done"
+				return result
+			except Exception as e:
+				job.status = "failed"
+				job.error = str(e)
+				logging.error("Job %s (%s) failed: %s" % (job.id, job.name, e))
+				raise
+			finally:
+				job.finished = time.time()
+		finally:
+			self.advance(job.key)
+
+	def cancel(self, job_id):
+		with self.lock:
+			job = self.jobs.get(job_id)
+			if job is None or not job.in_flight():
+				return False
+			job.cancelled.set()
+			if job.future is None:
+				# Still queued behind its key
+				self.waiting[job.key].remove(job)
+				job.status = "cancelled"
+				return True
+			future = job.future
+		if future.cancel():
+			job.status = "cancelled"
+			self.advance(job.key)
+		return True
+
+	def list_jobs(self, in_flight_only=False):
+		with self.lock:
+			return [
+				job.describe() for job in self.jobs.values()
+				if job.in_flight() or not in_flight_only
+			]
+
+	def trim(self):
+		finished = [job_id for job_id, job in self.jobs.items() if not job.in_flight()]
+		for job_id in finished[:max(len(self.jobs) - self.history, 0)]:
+			self.jobs.pop(job_id)
+
+	def shutdown(self):
+		for job in list(self.jobs.values()):
+			if job.in_flight():
+				self.cancel(job.id)
+		self.pool.shutdown(wait=False)
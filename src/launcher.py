@@ -3,7 +3,6 @@
 
 import logging
 import os
-import time
 import platform
 import gi
 
@@ -14,6 +13,11 @@ import webbrowser
 import traceback
 import threading
 from src.datalab_api import DataLabAPI
+from src.readiness import wait_until_ready
+from src.pipeline import Stage, StagePipeline, StageError
+from src.image_build import BuildCancelled, BuildProgress
+from src.service import ServiceClient, RemoteDataLabAPI
+from src.jobs import JobExecutor
 
 
 class DataLabLauncher:
@@ -32,6 +36,40 @@ class DataLabLauncher:
         os.path.join(os.path.dirname(__file__), os.pardir, "assets/logo.svg")
     )
 
+    datalab = None
+
+    # Entry validation debounce, in milliseconds
+    entry_check_delay = 200
+    check_timer = None
+    check_generation = 0
+
+    build_cancel = None
+    image_info = None
+
+    refresh_running = False
+    refresh_pending = False
+    # Batches in progress; list refreshes wait until none are left
+    refresh_holds = 0
+
+    # Default per-stage startup timeouts in seconds; None waits indefinitely
+    # (loading an image can mean a long build)
+    startup_timeouts = {
+        "API": 60,
+        "Drive": 15,
+        "Image": 30,
+        "Load": None,
+        "Update": 15
+    }
+
+    # Column order of the container_store model
+    ctr_list_columns = [
+        "Status", "Name", "Project ID", "Version", "User", "Deployment",
+        "Machine Info"
+    ]
+    # Syncs making more changes than this detach the model from the view, so
+    # it redraws once rather than once per row signal
+    ctr_list_bulk_threshold = 5
+
     state_dict = {
         'created': 'Created',
         'running': 'Running...',
@@ -77,58 +115,83 @@ class DataLabLauncher:
 
     def check_entry_match(self):
         name = self.get_name_entry()
-        ctrs = self.datalab.get_datalab_ctrs()
-        for ctr in ctrs:
-            ctr_name = self.datalab.get_ctr_name(ctr)
-            if ctr_name == name:
-                return ctr
-        return False
+        return self.datalab.get_ctr_by_name(name) or False
 
     @gui_queue
     def check_entries(self):
-        # In case previousy disabled:
-        self.proj_entry.set_sensitive(True)
-        self.machine_entry.set_sensitive(True)
-        self.machine_box.set_sensitive(True)
-        # Now to make the checks
-        name = self.get_name_entry()
-        proj = self.get_project_entry()
+        # Debounce: every call restarts the timer, so a burst of keystrokes
+        # results in a single validation once typing pauses
+        self.check_generation += 1
+        if self.check_timer is not None:
+            GLib.source_remove(self.check_timer)
+        self.check_timer = GLib.timeout_add(
+            self.entry_check_delay, self.run_entry_check
+        )
+
+    def run_entry_check(self):
+        self.check_timer = None
+        if self.datalab is None:
+            return False
+        # Not deduplicated: a newer check must run even while an older one,
+        # whose result will be discarded, is still going
+        self.jobs.submit(
+            "Validate Entries", self.validate_entries,
+            args=(
+                self.check_generation,
+                self.get_name_entry(),
+                self.get_project_entry(),
+                self.get_machine_box(),
+                self.get_machine_entry()
+            ),
+            key="entries", dedupe=False
+        )
+        # One-shot timer
+        return False
+
+    def validate_entries(self, generation, name, proj, deployment, gateway):
+        # Runs off the main loop against a single snapshot of container state
         ctrs = self.datalab.get_datalab_ctrs()
-        deployment = self.get_machine_box()
-        gateway = self.get_machine_entry()
-        ctr_running = self.datalab.get_running_ctrs()
-        ctr_match = self.check_entry_match()
-        if ctr_match:
-            # is_running = ctr_match in ctr_running
-            # TODO: Find out why we can't use ctr_match in
-            # ctr_running?
-            is_running = self.datalab.get_ctr_name(ctr_match) in [
-                self.datalab.get_ctr_name(ctr) for ctr in ctr_running
-            ]
-            # On Match, we need to overwrite/di Proj ID?
-            ctr_proj = self.datalab.get_ctr_project(ctr_match)
-            ctr_machine_info = self.datalab.get_ctr_machine_info(ctr_match)
-            ctr_deployment = self.datalab.get_ctr_deployment(ctr_match)
-            self.proj_entry.set_text(ctr_proj)
-            self.proj_entry.set_sensitive(False)
-            self.machine_entry.set_text(ctr_machine_info)
-            self.machine_entry.set_sensitive(False)
-            self.set_machine_box(ctr_deployment)
-            self.machine_box.set_sensitive(False)
+        ctr_match = None
+        for ctr in ctrs:
+            if self.datalab.get_ctr_name(ctr) == name:
+                ctr_match = ctr
+        result = {"match": ctr_match is not None}
+        if ctr_match is not None:
+            # Paused containers open (and stop) as if running
+            is_running = self.datalab.is_ctr_up(ctr_match)
+            result["project"] = self.datalab.get_ctr_project(ctr_match)
+            result["machine_info"] = self.datalab.get_ctr_machine_info(ctr_match)
+            result["deployment"] = self.datalab.get_ctr_deployment(ctr_match)
             if is_running:
-                self.update_main_controls(True, "Open", True, "Stop")
-            elif ctr_running:
-                self.update_main_controls(False, "Start", True, "Remove")
+                result["controls"] = (True, "Open", True, "Stop")
             else:
-                self.update_main_controls(True, "Start", True, "Remove")
+                result["controls"] = (True, "Start", True, "Remove")
         else:
             # TODO: Consider Gateway Regex testing here
             if deployment == "Local" and proj == "":
-                self.update_main_controls(False, "Create", False, "Remove")
+                result["controls"] = (False, "Create", False, "Remove")
             elif deployment == "Cloud" and (proj == "" or gateway == ""):
-                self.update_main_controls(False, "Create", False, "Remove")
+                result["controls"] = (False, "Create", False, "Remove")
             else:
-                self.update_main_controls(True, "Create", False, "Remove")
+                result["controls"] = (True, "Create", False, "Remove")
+        self.apply_entry_check(generation, result)
+
+    @gui_queue
+    def apply_entry_check(self, generation, result):
+        # The user kept typing while we validated; a newer check is pending
+        if generation != self.check_generation:
+            logging.debug("Dropping stale entry check")
+            return
+        # In case previousy disabled:
+        self.proj_entry.set_sensitive(not result["match"])
+        self.machine_entry.set_sensitive(not result["match"])
+        self.machine_box.set_sensitive(not result["match"])
+        if result["match"]:
+            # On Match, we need to overwrite/di Proj ID?
+            self.proj_entry.set_text(result["project"])
+            self.machine_entry.set_text(result["machine_info"])
+            self.set_machine_box(result["deployment"])
+        self.update_main_controls(*result["controls"])
 
     # Container Functions
 
@@ -180,6 +243,43 @@ class DataLabLauncher:
         self.switch_spinner(False)
         self.switch_main_controls(True)
 
+    def get_selected_ctrs(self):
+        model, path_list = self.ctr_view.get_selection().get_selected_rows()
+        name_col = self.ctr_list_columns.index("Name")
+        names = [model.get_value(model.get_iter(path), name_col) for path in path_list]
+        return [
+            ctr for ctr in (self.datalab.get_ctr_by_name(name) for name in names)
+            if ctr is not None
+        ]
+
+    def run_batch(self, action, operation, ctrs):
+        if not ctrs:
+            self.write_to_statusbar("No containers to %s" % action.lower())
+            return
+        self.switch_spinner(True)
+        self.switch_main_controls(False)
+        # Hold list refreshes until every running batch is done
+        with self.refresh_lock:
+            self.refresh_holds += 1
+        logging.info("%s %s containers" % (action, len(ctrs)))
+        self.write_to_statusbar("%s %s containers..." % (action, len(ctrs)))
+        try:
+            results = self.datalab.run_batch(operation, ctrs)
+        finally:
+            with self.refresh_lock:
+                self.refresh_holds -= 1
+        failed = sorted(name for name, error in results.items() if error is not None)
+        if failed:
+            self.write_error_to_statusbar(
+                "Failed to %s %s of %s containers: %s"
+                % (action.lower(), len(failed), len(results), ", ".join(failed))
+            )
+        else:
+            self.write_to_statusbar("%s %s containers: done" % (action, len(results)))
+        self.update_ctr_list()
+        self.switch_spinner(False)
+        self.switch_main_controls(True)
+
     def create_ctr(self, name, project_id, deployment, gateway):
         self.switch_spinner(True)
         self.switch_main_controls(False)
@@ -206,7 +306,7 @@ class DataLabLauncher:
             logging.info("Failed to create container")
             traceback.print_exc()
             self.write_error_to_statusbar(
-                "Failed to create container: %s" % e.message
+                "Failed to create container: %s" % getattr(e, "message", e)
             )
         self.update_ctr_list()
         self.switch_spinner(False)
@@ -217,37 +317,66 @@ class DataLabLauncher:
         self.switch_main_controls(False)
         ctr_address = self.datalab.get_ctr_address(ctr)
         ctr_name = self.datalab.get_ctr_name(ctr)
-        countdown = self.settings["opening_countdown"]
-        logging.info(
-            "Opening %s at %s in %s seconds" % (ctr_name, ctr_address, countdown)
-        )
-        while countdown > 0:
+        deadline = self.settings.get("opening_timeout", 60)
+        if self.datalab.wake_container(ctr):
+            self.write_to_statusbar("Resumed paused container: " + ctr_name)
+        logging.info("Waiting for %s at %s" % (ctr_name, ctr_address))
+
+        def on_attempt(attempt, elapsed):
             self.write_to_statusbar(
-                "Opening %s at %s in %s..." % (ctr_name, ctr_address, countdown)
+                "Waiting for %s at %s (%ss)..."
+                % (ctr_name, ctr_address, int(elapsed))
             )
-            time.sleep(1)
-            countdown = countdown - 1
+
         try:
+            ready_time = wait_until_ready(
+                ctr_address, deadline, on_attempt=on_attempt
+            )
             webbrowser.open(ctr_address, new=True)
-            self.write_to_statusbar("DataLab opened at %s" % ctr_address)
-            logging.info("DataLab opened at %s" % ctr_address)
+            self.write_to_statusbar(
+                "DataLab opened at %s (ready in %.1fs)" % (ctr_address, ready_time)
+            )
+            logging.info(
+                "DataLab opened at %s (ready in %.1fs)" % (ctr_address, ready_time)
+            )
         except Exception as e:
-            logging.error("Failed to open DataLab in browser")
-            self.write_error_to_statusbar("Failed to open DataLab in browser")
+            logging.error("Failed to open DataLab in browser: %s" % e)
+            self.write_error_to_statusbar("Failed to open DataLab: %s" % e)
         self.update_ctr_list()
         self.switch_spinner(False)
         self.switch_main_controls(True)
 
+    def refresh_projects(self):
+        logging.info("Refreshing Project IDs from running containers")
+        self.write_to_statusbar("Refreshing Project IDs...")
+        self.datalab.refresh_ctr_projects()
+        self.write_to_statusbar("Project IDs refreshed")
+        self.update_ctr_list()
+        self.check_entries()
+
     # Image Functions
 
-    def run_update(self):
-        self.switch_spinner(True)
-        self.switch_main_controls(False)
-        logging.info("Updating Image")
+    def run_update(self, background=False, cancel=None):
+        # In the background the current image stays in service while the
+        # new one builds under a staging tag, so the controls stay enabled
+        if not background:
+            self.switch_spinner(True)
+            self.switch_main_controls(False)
+        logging.info("Updating Image (background = %s)" % background)
         self.write_to_statusbar("Updating DataLab Image...")
+        self.build_cancel = cancel or threading.Event()
+        self.switch_cancel_control(True)
         try:
-            self.change_check_label("Image", "Updating...", colour="#FF9900")
-            self.datalab.update_image(self.settings["latest_dockerfile"])
+            self.change_check_label(
+                "Image",
+                "Updating in background..." if background else "Updating...",
+                colour="#FF9900"
+            )
+            self.datalab.update_image(
+                self.settings["latest_dockerfile"],
+                progress=self.write_to_statusbar,
+                cancel=self.build_cancel
+            )
             with open(self.settings["latest_dockerfile"] + "Dockerfile",
                       'r') as latest_file:
                 latest_content = latest_file.read()
@@ -257,49 +386,89 @@ class DataLabLauncher:
             self.write_to_statusbar("DataLab Image successfully updated")
             logging.info("Image updated")
             self.change_check_label("Image", "Update Successful", colour="green")
+            self.jobs.submit("Prune Images", self.run_prune, key="prune")
+        except BuildCancelled:
+            logging.info("Image update cancelled")
+            self.write_to_statusbar("DataLab Image update cancelled")
+            self.change_check_label(
+                "Image", "<a href='#'>Update Available</a>", "blue"
+            )
         except Exception as e:
             logging.error("Failed to update Image")
-            self.write_error_to_statusbar("Failed to update Image: %s" % e.message)
+            self.write_error_to_statusbar(
+                "Failed to update Image: %s" % getattr(e, "message", e)
+            )
             self.change_check_label("Image", "Update Failed", colour="red")
+        self.switch_cancel_control(False)
         self.update_ctr_list()
+        if not background:
+            self.switch_spinner(False)
+            self.switch_main_controls(True)
+
+    def run_prune(self):
+        try:
+            removed, reclaimed = self.datalab.prune_images(
+                self.settings.get("image_retention", 2)
+            )
+            if removed or reclaimed:
+                self.write_to_statusbar(
+                    "Removed %s old DataLab images, reclaimed %s"
+                    % (removed, BuildProgress.format_bytes(reclaimed))
+                )
+        except Exception as e:
+            logging.error("Failed to prune old Images: %s" % e)
+
+    def run_rollback(self):
+        self.switch_spinner(True)
+        self.switch_main_controls(False)
+        logging.info("Rolling back Image")
+        try:
+            self.datalab.rollback_image()
+            self.write_to_statusbar("Rolled back to the previous DataLab Image")
+            self.change_check_label(
+                "Image", "<a href='#'>Update Available</a>", "blue"
+            )
+        except Exception as e:
+            logging.error("Failed to roll back Image")
+            self.write_error_to_statusbar(
+                "Failed to roll back Image: %s" % getattr(e, "message", e)
+            )
         self.switch_spinner(False)
         self.switch_main_controls(True)
 
     # UI Function Calls
 
+    def submit_ctr_job(self, name, func):
+        # Keyed on the container, so jobs on one container run in order
+        ctr = self.check_entry_match()
+        if ctr:
+            self.jobs.submit(
+                name, func, (ctr,), key=self.datalab.get_ctr_name(ctr)
+            )
+
     def on_main_negative_clicked(self, widget):
         if widget.get_label() == "Stop":
-            threading.Thread(
-                target=self.stop_ctr,
-                args=(self.check_entry_match(),)
-            ).start()
+            self.submit_ctr_job("Stop", self.stop_ctr)
         elif widget.get_label() == "Remove":
-            threading.Thread(
-                target=self.remove_ctr,
-                args=(self.check_entry_match(),)
-            ).start()
+            self.submit_ctr_job("Remove", self.remove_ctr)
 
     def on_main_positive_clicked(self, widget):
         if widget.get_label() == "Start":
-            threading.Thread(
-                target=self.start_ctr,
-                args=(self.check_entry_match(),)
-            ).start()
+            self.submit_ctr_job("Start", self.start_ctr)
         elif widget.get_label() == "Create":
-            threading.Thread(
-                target=self.create_ctr,
-                args=(
-                    self.get_name_entry(),
+            name = self.get_name_entry()
+            self.jobs.submit(
+                "Create", self.create_ctr,
+                (
+                    name,
                     self.get_project_entry(),
                     self.get_machine_box(),
                     self.get_machine_entry()
-                )
-            ).start()
+                ),
+                key=name or "<Auto-Generated>"
+            )
         elif widget.get_label() == "Open":
-            threading.Thread(
-                target=self.open_ctr,
-                args=(self.check_entry_match(),)
-            ).start()
+            self.submit_ctr_job("Open", self.open_ctr)
 
     @gui_queue
     def on_select_container(self, container_view, row, column):
@@ -326,7 +495,74 @@ class DataLabLauncher:
         self.switch_main_controls(True)
 
     def on_update_link_clicked(self, arg1, arg2):
-        threading.Thread(target=self.run_update).start()
+        self.jobs.submit("Update", self.run_update, key="image", cancellable=True)
+
+    def check_connected(self):
+        # Menu actions are live before the startup checks connect
+        if self.datalab is None:
+            self.write_to_statusbar("Docker API not connected yet")
+            return False
+        return True
+
+    def on_stop_all_activate(self, widget):
+        if not self.check_connected():
+            return
+        self.jobs.submit(
+            "Stop All", self.run_batch,
+            ("Stop", self.datalab.stop_container, self.datalab.get_up_ctrs())
+        )
+
+    def on_remove_stopped_activate(self, widget):
+        if not self.check_connected():
+            return
+        ctrs = [
+            ctr for ctr in self.datalab.get_datalab_ctrs()
+            if not self.datalab.is_ctr_up(ctr)
+        ]
+        self.jobs.submit(
+            "Remove Stopped", self.run_batch,
+            ("Remove", self.datalab.remove_container, ctrs)
+        )
+
+    def on_restart_selected_activate(self, widget):
+        if not self.check_connected():
+            return
+        self.jobs.submit(
+            "Restart Selected", self.run_batch,
+            ("Restart", self.datalab.restart_container, self.get_selected_ctrs())
+        )
+
+    def on_force_remove_selected_activate(self, widget):
+        if not self.check_connected():
+            return
+        self.jobs.submit(
+            "Force Remove Selected", self.run_batch,
+            (
+                "Remove", self.datalab.force_remove_container,
+                self.get_selected_ctrs()
+            )
+        )
+
+    def on_rollback_image_activate(self, widget):
+        self.jobs.submit("Rollback", self.run_rollback, key="image")
+
+    def on_refresh_projects_activate(self, widget):
+        self.jobs.submit("Refresh Projects", self.refresh_projects)
+
+    def on_show_jobs_activate(self, widget):
+        jobs = self.jobs.list_jobs()
+        logging.info("Jobs: " + json.dumps(jobs, indent=2))
+        active = [job for job in jobs if job["status"] in ["pending", "running"]]
+        if active:
+            self.write_to_statusbar("Jobs: " + ", ".join(
+                "%s %s (%s)" % (job["name"], job["key"] or "", job["status"])
+                for job in active
+            ))
+        else:
+            self.write_to_statusbar("No jobs running")
+
+    def on_show_call_timings_activate(self, widget):
+        self.jobs.submit("Call Timings", self.show_call_timings)
 
     def on_project_entry_changed(self, widget):
         self.check_entries()
@@ -347,14 +583,64 @@ class DataLabLauncher:
     def on_status_positive_clicked(self, widget):
         if widget.get_label() == "Restart":
             logging.info("Restarting Start Up Checks")
-            threading.Thread(target=self.run_startup_checks).start()
+            self.jobs.submit("Startup Checks", self.run_startup_checks, key="startup")
 
-    @staticmethod
-    def on_status_negative_clicked(widget):
+    def on_status_negative_clicked(self, widget):
         if widget.get_label() == "Close":
             logging.info("Close button pressed")
-            Gtk.mainquit()
-            logging.info("DataLab Launcher Closed")
+            self.quit()
+        elif widget.get_label() == "Cancel":
+            logging.info("Cancelling Image build")
+            self.write_to_statusbar("Cancelling DataLab Image build...")
+            widget.set_sensitive(False)
+            if self.build_cancel is not None:
+                self.build_cancel.set()
+
+    def on_main_window_destroy(self, widget):
+        self.quit()
+
+    def quit(self):
+        if self.datalab is not None:
+            # A shared service outlives this window, so leave its containers
+            if self.settings.get("stop_on_exit", False) and not self.datalab.remote:
+                # All at once, so exit takes one stop timeout, not N
+                logging.info("Stopping running DataLab containers")
+                self.datalab.stop_all_containers()
+            self.log_call_timings()
+            self.datalab.close()
+        self.jobs.shutdown()
+        Gtk.main_quit()
+        logging.info("DataLab Launcher Closed")
+
+    def log_call_timings(self):
+        try:
+            stats = self.datalab.get_call_stats()
+        except Exception as e:
+            logging.error("Failed to collect Docker call timings: %s" % e)
+            return None
+        logging.info(
+            "Docker call timings (seconds): "
+            + json.dumps(stats, indent=2, sort_keys=True)
+        )
+        return stats
+
+    def show_call_timings(self):
+        if not self.check_connected():
+            return
+        stats = self.log_call_timings()
+        if not stats:
+            self.write_to_statusbar("No Docker calls recorded")
+            return
+        # Status bar gets the three operations with the most total time
+        slowest = sorted(stats.items(), key=lambda item: item[1]["total"], reverse=True)
+        self.write_to_statusbar("Call timings (see log): " + ", ".join(
+            "%s x%s p50 %.0fms p95 %.0fms max %.0fms%s" % (
+                operation, op_stats["count"], op_stats["p50"] * 1000,
+                op_stats["p95"] * 1000, op_stats["max"] * 1000,
+                " (%s errors)" % op_stats["errors"] if op_stats["errors"] else ""
+            )
+            for operation, op_stats in slowest[:3]
+        ))
 
     # UI Management Functions
 
@@ -383,37 +669,110 @@ class DataLabLauncher:
         elif state is True:
             self.status_spinner.start()
 
-    # @gui_queue
+    @gui_queue
     def change_check_label(self, label, string, colour="black"):
-        def run_function():
-            label_dict = {
-                "API": self.api_label,
-                "Drive": self.drive_label,
-                "Image": self.image_label,
-            }
-            label_dict[label].set_markup(
-                "<span color=\"" + colour + "\">" + string + "</span>"
-            )
+        # Called from the startup pipeline's worker threads
+        label_dict = {
+            "API": self.api_label,
+            "Drive": self.drive_label,
+            "Image": self.image_label,
+        }
+        label_dict[label].set_markup(
+            "<span color=\"" + colour + "\">" + string + "</span>"
+        )
 
-        return run_function()
+    def update_ctr_list(self):
+        # Coalesce: if a refresh is already gathering, ask it to go again
+        # rather than starting a second one alongside it
+        with self.refresh_lock:
+            if self.refresh_running or self.refresh_holds:
+                self.refresh_pending = True
+                return
+            self.refresh_running = True
+        # The flags above already coalesce, so the job skips deduplication
+        self.jobs.submit(
+            "Refresh List", self.refresh_ctr_list, key="ctr_list", dedupe=False
+        )
+
+    def refresh_ctr_list(self):
+        while True:
+            with self.refresh_lock:
+                self.refresh_pending = False
+            logging.debug("Updating Container List")
+            try:
+                ctrs_info = self.datalab.get_ctrs_info()
+                self.populate_ctr_list(ctrs_info)
+            except Exception as e:
+                logging.error("Failed to update Container List: %s" % e)
+            with self.refresh_lock:
+                if not self.refresh_pending:
+                    self.refresh_running = False
+                    return
 
     @gui_queue
-    def update_ctr_list(self):
-        logging.debug("Updating Container List")
-        ctrs_info = self.datalab.get_ctrs_info()
-        self.ctr_list.clear()
+    def populate_ctr_list(self, ctrs_info):
+        # Sync the model in place, keyed on container name, so selection and
+        # scroll position survive and unchanged rows cost nothing
+        rows = {}
+        order = []
         for ctr_info in ctrs_info:
-            row = [
-                ctr_info["Status"],
-                ctr_info["Name"],
-                ctr_info["Project ID"],
-                ctr_info["Version"],
-                ctr_info["User"],
-                ctr_info["Deployment"],
-                ctr_info["Machine Info"]
+            rows[ctr_info["Name"]] = [
+                ctr_info[column] for column in self.ctr_list_columns
             ]
-            self.ctr_list.append(row=row)
-        logging.debug("Container List Updated")
+            order.append(ctr_info["Name"])
+        name_col = self.ctr_list_columns.index("Name")
+        existing = {}
+        stale = []
+        tree_iter = self.ctr_list.get_iter_first()
+        while tree_iter is not None:
+            name = self.ctr_list.get_value(tree_iter, name_col)
+            if name in rows and name not in existing:
+                existing[name] = tree_iter
+            else:
+                stale.append(tree_iter)
+            tree_iter = self.ctr_list.iter_next(tree_iter)
+        updates = []
+        for name, tree_iter in existing.items():
+            for col, value in enumerate(rows[name]):
+                if self.ctr_list.get_value(tree_iter, col) != value:
+                    updates.append((tree_iter, col, value))
+        added = [name for name in order if name not in existing]
+        changes = len(stale) + len(updates) + len(added)
+        if changes == 0:
+            return
+        bulk = changes > self.ctr_list_bulk_threshold
+        if bulk:
+            # Detaching drops the selection and scroll position, so put
+            # them back afterwards
+            model, path_list = self.ctr_view.get_selection().get_selected_rows()
+            selected = set(
+                model.get_value(model.get_iter(path), name_col)
+                for path in path_list
+            )
+            scroll = self.ctr_view.get_vadjustment().get_value()
+            self.ctr_view.set_model(None)
+        try:
+            # ListStore iters persist, so removing rows keeps the others valid
+            for tree_iter in stale:
+                self.ctr_list.remove(tree_iter)
+            for tree_iter, col, value in updates:
+                self.ctr_list.set_value(tree_iter, col, value)
+            for name in added:
+                self.ctr_list.append(row=rows[name])
+        finally:
+            if bulk:
+                self.ctr_view.set_model(self.ctr_list)
+                selection = self.ctr_view.get_selection()
+                tree_iter = self.ctr_list.get_iter_first()
+                while tree_iter is not None:
+                    if self.ctr_list.get_value(tree_iter, name_col) in selected:
+                        selection.select_iter(tree_iter)
+                    tree_iter = self.ctr_list.iter_next(tree_iter)
+                self.ctr_view.get_vadjustment().set_value(scroll)
+        logging.debug(
+            "Container List synced: %s removed, %s cells updated, %s added"
+            % (len(stale), len(updates), len(added))
+        )
 
     @gui_queue
     def switch_main_controls(self, state):
@@ -456,6 +815,18 @@ class DataLabLauncher:
             logging.error("Unable to switch status controls state")
             raise ValueError("Switch state invalid. state = " + str(state))
 
+    @gui_queue
+    def switch_cancel_control(self, state):
+        # Only the negative status button is used, as a Cancel button
+        self.status_positive.hide()
+        if state is True:
+            self.status_negative.set_label("Cancel")
+            self.status_negative.set_sensitive(True)
+            self.status_negative.show()
+        else:
+            self.status_negative.set_sensitive(False)
+            self.status_negative.hide()
+
     @gui_queue
     def write_to_statusbar(self, string):
         self.status_label.set_text(string)
@@ -500,6 +871,141 @@ class DataLabLauncher:
         else:
             return False
 
+    def check_api(self):
+        logging.info("Checking DataLab - Docker API Connection...")
+        if self.datalab is not None:
+            self.datalab.close()
+        # Prefer a running background service, so this window shares its
+        # Docker connection and state instead of building its own
+        socket_path = self.settings.get("service_socket")
+        if socket_path and ServiceClient(socket_path).available():
+            self.datalab = RemoteDataLabAPI(
+                socket_path, batch_workers=self.settings.get("batch_workers", 16)
+            )
+        else:
+            self.datalab = self.create_local_api()
+        # Refresh the list whenever the Docker events change a container
+        self.datalab.registry.add_listener(self.update_ctr_list)
+        self.change_check_label("API", "Connected", "green")
+        logging.info("DataLab API Check Successful")
+        # Start populating the list now rather than after the other checks
+        self.update_ctr_list()
+
+    def create_local_api(self, watch_events=True):
+        return DataLabAPI.from_settings(
+            self.os_type, self.settings, self.containers_logfile, watch_events
+        )
+
+    def check_drives(self):
+        logging.info("Checking Shared Drive availability")
+        self.drives_present = self.check_shared_drives()
+        if self.drives_present is False:
+            logging.info("Shared Drives not accessible")
+            self.change_check_label("Drive", "Not Available", "red")
+            raise Exception("Cannot access Shared Drives")
+        elif self.drives_present == "All":
+            self.change_check_label("Drive", "Available", "green")
+            logging.info("Shared Drives partially accessible")
+        elif self.drives_present == "Some":
+            self.change_check_label("Drive", "Some Available", "#FF9900")
+            logging.info("Shared Drives partially accessible")
+
+    def check_image(self):
+        logging.info("Checking DataLab Image")
+        self.image_info = self.datalab.get_image_info()
+        self.image_loaded = self.image_info is not None
+        if self.image_loaded:
+            logging.info(
+                "DataLab Image version %s, Dockerfile digest %s"
+                % (self.image_info["version"], self.image_info["digest"])
+            )
+
+    def load_image(self):
+        if self.image_loaded is False:
+            self.change_check_label("Image", "Loading...", "#FF9900")
+            logging.info("No DataLab Image loaded")
+            self.write_to_statusbar("Pulling DataLab Image...")
+            # A first build can take a long time, so offer to cancel it. A
+            # cancelled build raises, failing the stage rather than moving
+            # on to the next Dockerfile
+            self.build_cancel = threading.Event()
+            self.switch_cancel_control(True)
+
+            def pull(image_type, dockerfile=None):
+                return self.datalab.pull_image(
+                    image_type, dockerfile, progress=self.write_to_statusbar,
+                    cancel=self.build_cancel
+                )
+
+            try:
+                #  - If not: Can we access the shared Dockerfile?
+                pull_outcome = None
+                if self.drives_present in ["All", "Some"]:
+                    #  - If so, pull Dockerfile
+                    pull_outcome = pull("Latest", self.settings['latest_dockerfile'])
+                    if pull_outcome is False:
+                        pull_outcome = pull("Local", self.local_dockerfile)
+                        if pull_outcome is False:
+                            pull_outcome = pull("Base")
+                            if pull_outcome is False:
+                                raise Exception("Unable to pull any Dockerfile")
+                elif self.drives_present is False:
+                    #  - Otherwise; pull from existing/base file
+                    pull_outcome = pull("Local", self.local_dockerfile)
+                    if pull_outcome is False:
+                        pull_outcome = pull("Base")
+                        if pull_outcome is False:
+                            raise Exception("Failed to pull DataLab Image")
+            except BuildCancelled:
+                logging.info("DataLab Image build cancelled")
+                raise
+            finally:
+                self.switch_cancel_control(False)
+            # After pulling an image, we update our local dockerfile to
+            # match Image pulled
+            logging.debug("Updating Local Dockerfile to match Image")
+            self.datalab.update_local_dockerfile(self.local_dockerfile,
+                                                 pull_outcome)
+            self.change_check_label("Image", "Ready", "green")
+            logging.debug("Local Dockerfile Updated")
+        elif self.image_loaded is True:
+            self.change_check_label("Image", "Ready", "green")
+            logging.info("DataLab Image already loaded")
+
+    def check_update(self):
+        logging.info("Checking for updates")
+        # Reuse the Image check's labels unless Load has just built a new one
+        self.update_available = self.datalab.check_for_update(
+            self.local_dockerfile, self.settings['latest_dockerfile'],
+            self.image_info if self.image_loaded else None
+        )
+        if self.update_available is True:
+            logging.info("Update Available")
+            self.change_check_label(
+                "Image", "<a href='#'>Update Available</a>", "blue"
+            )
+            if self.settings.get("background_updates", False):
+                self.jobs.submit(
+                    "Update", self.run_update, kwargs={"background": True},
+                    key="image", cancellable=True
+                )
+        else:
+            logging.info("No Update Available")
+
+    def startup_stages(self):
+        # Drive checks don't need the API, and the image presence check
+        # doesn't need the drives, so those overlap. Only loading a missing
+        # image and the update check wait on both.
+        timeouts = dict(self.startup_timeouts)
+        timeouts.update(self.settings.get("startup_timeouts", {}))
+        return [
+            Stage("API", self.check_api, timeout=timeouts["API"]),
+            Stage("Drive", self.check_drives, timeout=timeouts["Drive"]),
+            Stage("Image", self.check_image, ["API"], timeouts["Image"]),
+            Stage("Load", self.load_image, ["Image", "Drive"], timeouts["Load"]),
+            Stage("Update", self.check_update, ["Load"], timeouts["Update"]),
+        ]
+
     def run_startup_checks(self):
         logging.debug("Detached Startup Checks Thread")
         check_step = "UI Prep"
@@ -517,104 +1023,33 @@ class DataLabLauncher:
             # Annoyingly, we need to hide machine_entry in python
             self.machine_entry.hide()
             # Attempt to perform and resolve all checks
-            # First: Check/Instantiate Docker API Connection
-            check_step = "API"
-            logging.info("Checking DataLab - Docker API Connection...")
-            self.datalab = DataLabAPI(
-                self.os_type, self.settings['docker_client_timeout'],
-                self.containers_logfile, self.settings['local_drive']
-            )
-            self.change_check_label("API", "Connected", "green")
-            logging.info("DataLab API Check Successful")
-            # Second: Check Drives are present
-            check_step = "Drive"
-            logging.info("Checking Shared Drive availability")
-            self.drives_present = self.check_shared_drives()
-            if self.drives_present is False:
-                logging.info("Shared Drives not accessible")
-                self.change_check_label("Drive", "Not Available", "red")
-                raise Exception("Cannot access Shared Drives")
-            elif self.drives_present == "All":
-                self.change_check_label("Drive", "Available", "green")
-                logging.info("Shared Drives partially accessible")
-            elif self.drives_present == "Some":
-                self.change_check_label("Drive", "Some Available", "#FF9900")
-                logging.info("Shared Drives partially accessible")
-
-            # Third: DataLab Image Checks
-            check_step = "Image"
-            logging.info("Checking DataLab Image")
-            self.image_loaded = self.datalab.check_image_loaded()
-            if self.image_loaded is False:
-                self.change_check_label("Image", "Loading...", "#FF9900")
-                logging.info("No DataLab Image loaded")
-                self.write_to_statusbar("Pulling DataLab Image...")
-                #  - If not: Can we access the shared Dockerfile?
-                pull_outcome = None
-                if self.drives_present in ["All", "Some"]:
-                    #  - If so, pull Dockerfile
-                    pull_outcome = self.datalab.pull_image(
-                        "Latest", self.settings['latest_dockerfile']
-                    )
-                    if pull_outcome is False:
-                        pull_outcome = self.datalab.pull_image(
-                            "Local", self.local_dockerfile
-                        )
-                        if pull_outcome is False:
-                            pull_outcome = self.datalab.pull_image("Base")
-                            if pull_outcome is False:
-                                raise Exception("Unable to pull any Dockerfile")
-                elif self.drives_present is False:
-                    #  - Otherwise; pull from existing/base file
-                    pull_outcome = self.datalab.pull_image("Local",
-                                                           self.local_dockerfile)
-                    if pull_outcome is False:
-                        pull_outcome = self.datalab.pull_image("Base")
-                        if pull_outcome is False:
-                            raise Exception("Failed to pull DataLab Image")
-                # After pulling an image, we update our local dockerfile to
-                # match Image pulled
-                logging.debug("Updating Local Dockerfile to match Image")
-                self.datalab.update_local_dockerfile(self.local_dockerfile,
-                                                     pull_outcome)
-                self.change_check_label("Image", "Ready", "green")
-                logging.debug("Local Dockerfile Updated")
-            elif self.image_loaded is True:
-                self.change_check_label("Image", "Ready", "green")
-                logging.info("DataLab Image already loaded")
-            # Finally: Check for updates
-            check_step = "Update"
-            logging.info("Checking for updates")
-            self.update_available = self.datalab.compare_dockerfiles(
-                self.local_dockerfile, self.settings['latest_dockerfile']
-            )
-            if self.update_available is False:
-                logging.info("Update Available")
-                self.change_check_label(
-                    "Image", "<a href='#'>Update Available</a>", "blue"
-                )
-            else:
-                logging.info("No Update Available")
+            check_step = "Checks"
+            StagePipeline(self.startup_stages()).run()
             check_step = "Cleanup"
             self.switch_main_controls(True)
             self.write_to_statusbar("Startup Checks Complete. Launcher Ready.")
             logging.info("All Startup Checks complete")
-            logging.info("Updating Container List post-checks")
-            self.update_ctr_list()
+            self.jobs.submit("Prune Images", self.run_prune, key="prune")
+            # A shared service keeps its own standby pool
+            if not self.datalab.remote:
+                self.datalab.standby_pool.start()
+                self.datalab.idle_manager.start()
             # Stop the spinner
             self.switch_spinner(False)
         except Exception as e:
+            if isinstance(e, StageError):
+                check_step = e.stage
             self.switch_spinner(False)
             logging.error("Startup Checks stopped unexpectedly")
             logging.error("Failed at check step : " + check_step)
-            self.write_error_to_statusbar(e.message)
-            logging.error(traceback.print_exc())
+            self.write_error_to_statusbar(getattr(e, "message", str(e)))
+            logging.error(traceback.format_exc())
             self.switch_status_controls(True, "Restart", "Close")
             if check_step == "API":
                 self.change_check_label("API", "Failed", "red")
             elif check_step == "Drive":
                 self.change_check_label("Drive", "Failed", "red")
-            elif check_step == "Image":
+            elif check_step in ["Image", "Load"]:
                 self.change_check_label("Image", "Failed", "red")
 
     def __init__(self, settings_file):
@@ -628,6 +1063,8 @@ class DataLabLauncher:
         with open(settings_file) as data:
             self.settings = json.load(data)
         logging.debug("Settings pulled")
+        self.refresh_lock = threading.Lock()
+        self.jobs = JobExecutor(self.settings.get("job_workers", 8))
         # Instantiate GUI via Glade
         logging.debug("Binding UI Components from Glade File...")
         self.glade = Gtk.Builder()
@@ -664,4 +1101,4 @@ class DataLabLauncher:
         # - Separate thread to allow for user input
         self.write_to_statusbar("Running Start Up Checks...")
         logging.info("Running Start Up Checks...")
-        threading.Thread(target=self.run_startup_checks).start()
+        self.jobs.submit("Startup Checks", self.run_startup_checks, key="startup")
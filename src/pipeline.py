@@ -0,0 +1,106 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+
+	def __init__(self, name, func, requires=(), timeout=None):
+		self.name = name
+		self.func = func
+		self.requires = list(requires)
+		self.timeout = timeout
+
+
+class StageError(Exception):
+
+	def __init__(self, stage, message):
+		Exception.__init__(self, message)
+		self.stage = stage
+		self.message = message
+
+
+# Runs a set of stages as a dependency graph: each stage starts as soon as
+# every stage it requires has succeeded, so independent stages overlap. The
+# first failure or timeout stops anything new from starting and is raised as
+# a StageError naming the stage.
+class StagePipeline:
+
+	def __init__(self, stages, max_workers=4):
+		self.stages = stages
+		self.max_workers = max_workers
+		self.results = {}
+		self.timings = {}
+
+	def ready_stages(self, started):
+		return [
+			stage for stage in self.stages
+			if stage.name not in started
+			and all(name in self.results for name in stage.requires)
+		]
+
+	def timed(self, stage):
+		start = time.time()
+		try:
+			return stage.func()
+		finally:
+			self.timings[stage.name] = time.time() - start
+
+	def run(self):
+		executor = ThreadPoolExecutor(max_workers=self.max_workers)
+		running = {}
+		started = set()
+		failure = None
+		try:
+			while True:
+				if failure is None:
+					for stage in self.ready_stages(started):
+						logging.debug("Starting stage: %s" % stage.name)
+						future = executor.submit(self.timed, stage)
+						running[future] = (stage, time.time())
+						started.add(stage.name)
+				if not running:
+					break
+				deadlines = [
+					begun + stage.timeout
+					for stage, begun in running.values()
+					if stage.timeout is not None
+				]
+				timeout = (
+					max(min(deadlines) - time.time(), 0) if deadlines else None
+				)
+				done, not_done = wait(
+					list(running), timeout=timeout, return_when=FIRST_COMPLETED
+				)
+				for future in done:
+					stage, begun = running.pop(future)
+					try:
+						self.results[stage.name] = future.result()
+					except Exception as e:
+						if failure is None:
+							failure = StageError(stage.name, getattr(e, "message", str(e)))
+				now = time.time()
+				for future in not_done:
+					stage, begun = running[future]
+					if stage.timeout is not None and now - begun >= stage.timeout:
+						running.pop(future)
+						self.timings[stage.name] = now - begun
+						if failure is None:
+							failure = StageError(
+								stage.name,
+								"%s check timed out after %ss" % (stage.name, stage.timeout)
+							)
+		finally:
+			executor.shutdown(wait=False)
+		logging.info(
+			"Stage timings: " + ", ".join(
+				"%s %.2fs" % (stage.name, self.timings[stage.name])
+				for stage in self.stages if stage.name in self.timings
+			)
+		)
+		if failure is not None:
+			raise failure
+		unmet = [stage.name for stage in self.stages if stage.name not in started]
+		if unmet:
+			raise StageError(unmet[0], "Unmet stage requirements: " + ", ".join(unmet))
+		return self.results
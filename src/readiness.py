@@ -0,0 +1,52 @@
+import logging
+import socket
+import time
+
+try:
+	from httplib import HTTPConnection, HTTPException
+	from urlparse import urlparse
+except ImportError:
+	from http.client import HTTPConnection, HTTPException
+	from urllib.parse import urlparse
+
+
+# Polls address until the server answers with anything other than a 5xx,
+# backing off exponentially between attempts and reusing one keep-alive
+# connection. Returns the seconds taken, or raises once deadline is passed.
+def wait_until_ready(
+		address, deadline=60, initial_delay=0.1, max_delay=2, timeout=2,
+		on_attempt=None
+):
+	parsed = urlparse(address)
+	conn = HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+	start = time.time()
+	delay = initial_delay
+	attempt = 0
+	try:
+		while True:
+			attempt += 1
+			try:
+				conn.request("GET", parsed.path or "/")
+				response = conn.getresponse()
+				response.read()
+				if response.status < 500:
+					ready_time = time.time() - start
+					logging.debug(
+						"%s ready after %s attempts in %.2fs"
+						% (address, attempt, ready_time)
+					)
+					return ready_time
+			except (socket.error, HTTPException) as e:
+				# Drop the socket; the next request reconnects
+				conn.close()
+			elapsed = time.time() - start
+			if elapsed + delay > deadline:
+				raise Exception(
+					"DataLab did not respond within %s seconds" % deadline
+				)
+			if on_attempt is not None:
+				on_attempt(attempt, elapsed)
+			time.sleep(delay)
+			delay = min(delay * 2, max_delay)
+	finally:
+		conn.close()
@@ -0,0 +1,410 @@
+import json
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+	import SocketServer as socketserver
+	from Queue import Queue, Empty
+except ImportError:
+	import socketserver
+	from queue import Queue, Empty
+
+from src.ctr_registry import ContainerRegistry
+from src.datalab_api import DataLabAPI
+from src.image_build import BuildCancelled
+from src.readiness import wait_until_ready
+
+# Optional background service that owns the one Docker client, container
+# registry and containers.json, and serves them to any number of launcher
+# windows and CLI invocations over a local Unix socket.
+#
+# Protocol: the client sends one JSON line {"method": ..., "params": {...}}
+# and reads JSON lines back: any number of {"progress": message}, then
+# {"result": ...} or {"error": message}. The "events" method instead keeps
+# the connection open and streams container events, one per line. Image
+# builds ("update", "pull") are cancelled by the client hanging up.
+
+
+class ServiceHandler(socketserver.StreamRequestHandler):
+
+	cancellable = ["update", "pull"]
+
+	def send(self, message):
+		self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+		self.wfile.flush()
+
+	def watch_disconnect(self, cancel):
+		# The client sends nothing after its request, so a read only returns
+		# once it has hung up
+		try:
+			if not self.request.recv(1):
+				cancel.set()
+		except socket.error:
+			cancel.set()
+
+	def handle(self):
+		try:
+			request = json.loads(self.rfile.readline().decode("utf-8"))
+		except ValueError:
+			self.send({"error": "Malformed request"})
+			return
+		method = request.get("method")
+		params = request.get("params") or {}
+		if method == "events":
+			self.server.service.stream_events(self.send)
+			return
+		cancel = None
+		if method in self.cancellable:
+			cancel = threading.Event()
+			watcher = threading.Thread(target=self.watch_disconnect, args=(cancel,))
+			watcher.daemon = True
+			watcher.start()
+		try:
+			result = self.server.service.dispatch(
+				method, params, lambda message: self.send({"progress": message}),
+				cancel
+			)
+			self.send({"result": result})
+		except BuildCancelled:
+			logging.info("Service call %s cancelled by the client" % method)
+		except socket.error:
+			logging.debug("Service call %s: client disconnected" % method)
+		except Exception as e:
+			logging.error("Service call %s failed: %s" % (method, e))
+			try:
+				self.send({"error": str(getattr(e, "message", None) or e)})
+			except socket.error:
+				pass
+
+
+class ServiceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+
+class DataLabService:
+
+	heartbeat_interval = 30
+
+	def __init__(self, datalab, socket_path):
+		self.datalab = datalab
+		self.socket_path = os.path.expanduser(socket_path)
+		self.server = None
+
+	def find_ctr(self, name):
+		ctr = self.datalab.get_ctr_by_name(name)
+		if ctr is None:
+			raise Exception("No DataLab container named %s" % name)
+		return ctr
+
+	def dispatch(self, method, params, progress, cancel=None):
+		datalab = self.datalab
+		if method == "containers":
+			return [ctr.attrs for ctr in datalab.get_datalab_ctrs()]
+		elif method == "container":
+			for ctr in datalab.get_datalab_ctrs():
+				if ctr.id == params["id"]:
+					return ctr.attrs
+			return None
+		elif method == "ctrs_info":
+			return datalab.get_ctrs_info()
+		elif method == "project":
+			return datalab.get_ctr_project(
+				self.find_ctr(params["name"]), live=params.get("live", False)
+			)
+		elif method == "refresh_projects":
+			return datalab.refresh_ctr_projects()
+		elif method in [
+				"start", "stop", "restart", "remove", "force_remove", "pause",
+				"unpause"
+		]:
+			operation = getattr(datalab, method + "_container")
+			operation(self.find_ctr(params["name"]))
+			return True
+		elif method == "create":
+			ctr = datalab.create_container(**params)
+			return datalab.get_ctr_name(ctr)
+		elif method == "open":
+			ctr = self.find_ctr(params["name"])
+			datalab.wake_container(ctr)
+			address = datalab.get_ctr_address(ctr)
+			return wait_until_ready(address, params.get("deadline", 60))
+		elif method == "image_info":
+			return datalab.get_image_info()
+		elif method == "check_for_update":
+			return datalab.check_for_update(
+				params["local"], params["latest"], params.get("image_info")
+			)
+		elif method == "update":
+			return datalab.update_image(
+				params["dockerfile"], progress=progress, cancel=cancel
+			)
+		elif method == "pull":
+			return datalab.pull_image(
+				params["image_type"], params.get("dockerfile"), progress=progress,
+				cancel=cancel
+			)
+		elif method == "rollback":
+			datalab.rollback_image()
+			return True
+		elif method == "prune":
+			return datalab.prune_images(params.get("keep_versions", 2))
+		elif method == "call_stats":
+			return datalab.get_call_stats()
+		elif method == "ping":
+			return True
+		raise Exception("Unknown method: %s" % method)
+
+	def stream_events(self, send):
+		events = Queue()
+		self.datalab.registry.add_event_listener(events.put)
+		try:
+			while True:
+				try:
+					event = events.get(timeout=self.heartbeat_interval)
+				except Empty:
+					send({"heartbeat": True})
+					continue
+				# Our view was rebuilt; hang up so the client resyncs too
+				if event.get("Action") == "resync":
+					return
+				send(event)
+		except socket.error:
+			logging.debug("Events subscriber disconnected")
+		finally:
+			self.datalab.registry.remove_event_listener(events.put)
+
+	def serve_forever(self):
+		if os.path.exists(self.socket_path):
+			os.remove(self.socket_path)
+		self.server = ServiceServer(self.socket_path, ServiceHandler)
+		self.server.service = self
+		os.chmod(self.socket_path, 0o600)
+		logging.info("DataLab service listening on %s" % self.socket_path)
+		try:
+			self.server.serve_forever()
+		finally:
+			self.server.server_close()
+			if os.path.exists(self.socket_path):
+				os.remove(self.socket_path)
+
+	def shutdown(self):
+		if self.server is not None:
+			self.server.shutdown()
+
+
+class ServiceClient:
+
+	def __init__(self, socket_path, timeout=None):
+		self.socket_path = os.path.expanduser(socket_path)
+		self.timeout = timeout
+
+	def open(self, method, params):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.settimeout(self.timeout)
+		sock.connect(self.socket_path)
+		request = {"method": method, "params": params}
+		sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+		return sock
+
+	@staticmethod
+	def read_lines(sock):
+		stream = sock.makefile("rb")
+		try:
+			for line in stream:
+				yield json.loads(line.decode("utf-8"))
+		finally:
+			stream.close()
+
+	@staticmethod
+	def hang_up_on_cancel(sock, cancel, done):
+		while not done.is_set():
+			if cancel.wait(0.25):
+				try:
+					sock.shutdown(socket.SHUT_RDWR)
+				except socket.error:
+					pass
+				return
+
+	def call(self, method, progress=None, cancel=None, **params):
+		# Setting cancel hangs up, which the service takes as a cancel
+		sock = self.open(method, params)
+		done = threading.Event()
+		if cancel is not None:
+			watcher = threading.Thread(
+				target=self.hang_up_on_cancel, args=(sock, cancel, done)
+			)
+			watcher.daemon = True
+			watcher.start()
+		try:
+			for message in self.read_lines(sock):
+				if "progress" in message:
+					if progress is not None:
+						progress(message["progress"])
+				elif "error" in message:
+					raise Exception(message["error"])
+				else:
+					return message.get("result")
+		except (socket.error, ValueError):
+			if cancel is None or not cancel.is_set():
+				raise
+		finally:
+			done.set()
+			sock.close()
+		if cancel is not None and cancel.is_set():
+			raise BuildCancelled("Image build cancelled")
+		raise Exception("DataLab service closed the connection")
+
+	def events(self):
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		sock.connect(self.socket_path)
+		sock.sendall(
+			(json.dumps({"method": "events", "params": {}}) + "\n").encode("utf-8")
+		)
+		return EventStream(sock, self.read_lines(sock))
+
+	def available(self):
+		try:
+			return self.call("ping") is True
+		except Exception:
+			return False
+
+
+class EventStream:
+
+	def __init__(self, sock, lines):
+		self.sock = sock
+		self.lines = lines
+
+	def __iter__(self):
+		for message in self.lines:
+			if "heartbeat" not in message:
+				yield message
+
+	def close(self):
+		self.sock.close()
+
+
+class RemoteContainer:
+
+	def __init__(self, attrs):
+		self.attrs = attrs
+		self.id = attrs[u"Id"]
+
+	@property
+	def name(self):
+		return self.attrs[u"Names"][0].lstrip(u"/")
+
+
+# Thin client with the DataLabAPI surface the launcher and CLI use. Container
+# attrs come from the service in the sparse list format, so the inherited
+# label/state getters work unchanged; everything touching Docker or
+# containers.json is a call to the service.
+class RemoteDataLabAPI(DataLabAPI):
+
+	remote = True
+
+	def __init__(self, socket_path, batch_workers=16):
+		logging.info("Connecting to DataLab service at %s" % socket_path)
+		self.client = ServiceClient(socket_path)
+		if not self.client.available():
+			raise Exception("DataLab service not available at %s" % socket_path)
+		self.batch_pool = ThreadPoolExecutor(max_workers=batch_workers)
+		self.registry = ContainerRegistry(
+			seed=lambda: [
+				RemoteContainer(attrs) for attrs in self.client.call("containers")
+			],
+			fetch=self.fetch_ctr,
+			events=self.client.events,
+			get_name=self.get_ctr_name
+		)
+		self.registry.start()
+
+	def fetch_ctr(self, ctr_id):
+		attrs = self.client.call("container", id=ctr_id)
+		return RemoteContainer(attrs) if attrs is not None else None
+
+	def close(self):
+		self.registry.stop()
+		self.batch_pool.shutdown(wait=False)
+
+	# Containers
+
+	def get_ctrs_info(self):
+		return self.client.call("ctrs_info")
+
+	def get_ctr_project(self, ctr, live=False):
+		return self.client.call("project", name=self.get_ctr_name(ctr), live=live)
+
+	def refresh_ctr_projects(self):
+		return self.client.call("refresh_projects")
+
+	def start_container(self, ctr):
+		self.client.call("start", name=self.get_ctr_name(ctr))
+
+	def stop_container(self, ctr):
+		self.client.call("stop", name=self.get_ctr_name(ctr))
+
+	def restart_container(self, ctr):
+		self.client.call("restart", name=self.get_ctr_name(ctr))
+
+	def pause_container(self, ctr):
+		self.client.call("pause", name=self.get_ctr_name(ctr))
+
+	def unpause_container(self, ctr):
+		self.client.call("unpause", name=self.get_ctr_name(ctr))
+
+	def remove_container(self, ctr, force=False):
+		method = "force_remove" if force else "remove"
+		self.client.call(method, name=self.get_ctr_name(ctr))
+
+	def create_container(
+			self, name, project_id, deployment, gateway, local_drive, drives,
+			local_port=None
+	):
+		name = self.client.call(
+			"create", name=name, project_id=project_id, deployment=deployment,
+			gateway=gateway, local_drive=local_drive, drives=drives,
+			local_port=local_port
+		)
+		return self.registry.get(name) or self.fetch_by_name(name)
+
+	def fetch_by_name(self, name):
+		for attrs in self.client.call("containers"):
+			ctr = RemoteContainer(attrs)
+			if ctr.name == name:
+				return ctr
+		raise Exception("Created container %s not found" % name)
+
+	# Images
+
+	def get_image_info(self, tag="dll_datalab:latest"):
+		return self.client.call("image_info")
+
+	def check_for_update(self, local, latest, image_info=None):
+		return self.client.call(
+			"check_for_update", local=local, latest=latest, image_info=image_info
+		)
+
+	def update_image(self, dockerfile, progress=None, cancel=None):
+		self.client.call(
+			"update", progress=progress, cancel=cancel, dockerfile=dockerfile
+		)
+
+	def pull_image(self, image_type, dockerfile=None, progress=None, cancel=None):
+		return self.client.call(
+			"pull", progress=progress, cancel=cancel, image_type=image_type,
+			dockerfile=dockerfile
+		)
+
+	def rollback_image(self):
+		return self.client.call("rollback")
+
+	def prune_images(self, keep_versions=2):
+		return tuple(self.client.call("prune", keep_versions=keep_versions))
+
+	# Timings of the service's own Docker calls
+	def get_call_stats(self):
+		return self.client.call("call_stats")
@@ -0,0 +1,180 @@
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+try:
+	from ConfigParser import RawConfigParser
+except ImportError:
+	from configparser import RawConfigParser
+
+
+# Keeps `size` spare DataLab containers created on the current image, so a
+# Local create can claim one by renaming it rather than building a new one.
+# With warm, spares are also started then paused, so a claimed container's
+# notebook server is already up. Spares are recognised by their name prefix
+# and are created without a project; a claim writes the project into the
+# container's gcloud configuration and records the drive the spare mounted
+# (named after the spare) as DRIVE in containers.json. Cloud containers need
+# GATEWAY_VM at create time, so they are never served from the pool.
+class StandbyPool:
+
+	prefix = "dll_standby_"
+
+	def __init__(self, datalab, size=0, drives=(), warm=False):
+		self.datalab = datalab
+		self.size = size
+		self.drives = list(drives)
+		self.warm = warm
+		self.started = False
+		self.fill_pending = False
+		# Spares being claimed: no longer free, though still listed under
+		# their standby name until the claim finishes
+		self.claimed = set()
+		self.lock = threading.Lock()
+		self.fill_lock = threading.Lock()
+		self.executor = ThreadPoolExecutor(max_workers=1)
+
+	@classmethod
+	def is_member(cls, name):
+		return name.startswith(cls.prefix)
+
+	def members(self):
+		return [
+			ctr for ctr in self.datalab.registry.list()
+			if self.is_member(self.datalab.get_ctr_name(ctr))
+			and ctr.id not in self.claimed
+		]
+
+	# Filling
+
+	def start(self):
+		if self.size > 0:
+			self.started = True
+			self.refill()
+
+	def stop(self):
+		self.started = False
+		self.executor.shutdown(wait=False)
+
+	def refill(self):
+		# Coalesce: at most one fill queued behind the running one
+		if not self.started:
+			return
+		with self.fill_lock:
+			if self.fill_pending:
+				return
+			self.fill_pending = True
+		self.executor.submit(self.fill)
+
+	def fill(self):
+		with self.fill_lock:
+			self.fill_pending = False
+		try:
+			image = self.datalab.get_image_info()
+			if image is None:
+				return
+			# Spares on any other image are invalid once the image changes
+			for ctr in self.members():
+				if ctr.attrs.get(u"ImageID") != image["id"]:
+					logging.info(
+						"Removing standby container %s on an old image"
+						% self.datalab.get_ctr_name(ctr)
+					)
+					self.remove(ctr)
+			while self.started and len(self.members()) < self.size:
+				self.add()
+		except Exception as e:
+			logging.error("Failed to fill standby pool: %s" % e)
+
+	def remove(self, ctr):
+		# The spare's drive has nothing of anyone's on it, so it goes too
+		name = self.datalab.get_ctr_name(ctr)
+		self.datalab.remove_container(ctr, force=True)
+		shutil.rmtree(self.drive_path(name), ignore_errors=True)
+
+	def drive_path(self, name):
+		return os.path.join(
+			os.path.abspath(self.datalab.local_drive), "containers", name
+		)
+
+	def add(self):
+		name = self.prefix + uuid.uuid4().hex[:8]
+		ctr = self.datalab.create_container(
+			name, "", "Local", None, self.datalab.local_drive, self.drives
+		)
+		if self.warm:
+			self.datalab.start_container(ctr)
+			self.datalab.pause_container(ctr)
+		logging.info("Added standby container %s" % name)
+
+	# Claiming
+
+	def fits(self, deployment, gateway, local_drive, drives):
+		return (
+			self.size > 0 and deployment == "Local" and not gateway
+			and list(drives) == self.drives
+			and os.path.abspath(local_drive)
+			== os.path.abspath(self.datalab.local_drive)
+		)
+
+	def claim(self, name, project_id, deployment, gateway, local_drive, drives):
+		# Returns the claimed container, or None if no spare fits the request
+		if not self.fits(deployment, gateway, local_drive, drives):
+			return None
+		image = self.datalab.get_image_info()
+		if image is None:
+			return None
+		with self.lock:
+			spares = [
+				ctr for ctr in self.members()
+				if ctr.attrs.get(u"ImageID") == image["id"]
+			]
+			if not spares:
+				return None
+			spare = spares[0]
+			self.claimed.add(spare.id)
+		try:
+			spare_name = self.datalab.get_ctr_name(spare)
+			name = name or self.datalab.gen_ctr_name()
+			self.datalab.rename_container(spare, name)
+			logging.info("Claimed standby container %s as %s" % (spare_name, name))
+			self.set_project(spare_name, project_id)
+			self.datalab.ctrs_log.pop(spare_name)
+			self.datalab.ctrs_log.add(name, {
+				"PROJECT_ID": project_id,
+				"USER": "-",
+				"DRIVE": spare_name
+			})
+			if self.datalab.get_ctr_state(spare) == u"paused":
+				self.datalab.unpause_container(spare)
+			ctr = self.datalab.query_datalab_ctr(spare.id)
+			if ctr is not None:
+				self.datalab.registry.upsert(ctr)
+		finally:
+			with self.lock:
+				self.claimed.discard(spare.id)
+		self.refill()
+		return ctr or spare
+
+	def set_project(self, drive_name, project_id):
+		# The spare's gcloud configuration lives on its drive, under .config
+		config_dir = os.path.join(self.drive_path(drive_name), ".config")
+		configurations = os.path.join(config_dir, "configurations")
+		if not os.path.exists(configurations):
+			os.makedirs(configurations)
+		active_config = os.path.join(config_dir, "active_config")
+		if not os.path.exists(active_config):
+			with open(active_config, 'w') as f:
+				f.write("default")
+		with open(active_config, 'r') as f:
+			config_name = f.read().strip() or "default"
+		config_file = os.path.join(configurations, "config_" + config_name)
+		config = RawConfigParser()
+		config.read(config_file)
+		if not config.has_section("core"):
+			config.add_section("core")
+		config.set("core", "project", project_id)
+		with open(config_file, 'w') as f:
+			config.write(f)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+# Runs DataLabAPI against the in-process fake daemon from benchmarks, in a
+# throwaway workspace (see benchmarks.hot_paths.Workspace)
+
+import platform
+import sys
+import unittest
+
+from benchmarks.fake_docker import FakeDocker
+from benchmarks.hot_paths import Workspace
+
+
+class FakeDaemonTestCase(unittest.TestCase):
+
+	containers = 4
+
+	def setUp(self):
+		self.workspace = Workspace(self.containers)
+		self.daemon = FakeDocker(containers=self.containers, latency=0)
+		sys.modules["docker"] = self.daemon
+		self.apis = []
+
+	def tearDown(self):
+		self.daemon.release()
+		for datalab in self.apis:
+			datalab.close()
+		sys.modules.pop("docker", None)
+		self.workspace.remove()
+
+	def connect(self, **kwargs):
+		from src.datalab_api import DataLabAPI
+		kwargs.setdefault("watch_events", False)
+		datalab = DataLabAPI(
+			platform.system(), 30, self.workspace.containers_logfile,
+			self.workspace.local_drive, **kwargs
+		)
+		self.apis.append(datalab)
+		return datalab
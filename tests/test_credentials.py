@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import unittest
+
+from benchmarks.hot_paths import Workspace
+from src.credentials import CredentialsCache
+
+
+class CountingCache(CredentialsCache):
+
+	def __init__(self, *args, **kwargs):
+		CredentialsCache.__init__(self, *args, **kwargs)
+		self.scans = 0
+
+	def scan(self):
+		self.scans += 1
+		# Long enough for every reader to find the cache stale
+		time.sleep(0.1)
+		CredentialsCache.scan(self)
+
+
+class CredentialsCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.workspace = Workspace(20)
+		self.cache = CountingCache(
+			os.path.join(self.workspace.local_drive, "containers")
+		)
+
+	def tearDown(self):
+		self.workspace.remove()
+
+	def test_cold_refresh_scans_once(self):
+		users = {}
+
+		def read(index):
+			name = "datalab_%04d" % index
+			users[name] = self.cache.get_user(name)
+
+		threads = [threading.Thread(target=read, args=(index,)) for index in range(20)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(self.cache.scans, 1)
+		self.assertEqual(users["datalab_0007"], "user7@example.com")
+
+	def test_invalidate_rescans(self):
+		self.assertEqual(self.cache.get_user("datalab_0001"), "user1@example.com")
+		path = self.cache.credentials_path("datalab_0001")
+		os.remove(path)
+		self.cache.invalidate("datalab_0001")
+		self.assertIsNone(self.cache.get_user("datalab_0001"))
+		self.assertEqual(self.cache.scans, 2)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+
+from benchmarks.fake_docker import FakeEventStream
+from src.ctr_registry import ContainerRegistry
+from tests.support import FakeDaemonTestCase
+
+
+class FakeCtr:
+
+	def __init__(self, ctr_id, name):
+		self.id = ctr_id
+		self.name = name
+
+
+def wait_for(condition, timeout=3):
+	end = time.time() + timeout
+	while not condition():
+		if time.time() > end:
+			raise AssertionError("Timed out waiting for the registry")
+		time.sleep(0.01)
+
+
+class ContainerRegistryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.ctrs = {}
+		self.streams = []
+		self.seeds = 0
+		self.registry = ContainerRegistry(
+			self.seed, self.ctrs.get, self.events, lambda ctr: ctr.name,
+			resync_delay=0.01
+		)
+		self.addCleanup(self.registry.stop)
+
+	def seed(self):
+		self.seeds += 1
+		return list(self.ctrs.values())
+
+	def events(self):
+		stream = FakeEventStream()
+		self.streams.append(stream)
+		return stream
+
+	def test_start_is_idempotent(self):
+		self.registry.start()
+		thread = self.registry.thread
+		self.registry.start()
+		self.assertIs(self.registry.thread, thread)
+		self.assertEqual(len(self.streams), 1)
+		self.assertEqual(self.seeds, 1)
+
+	def test_start_seeds_before_returning(self):
+		self.ctrs["a"] = FakeCtr("a", "datalab_a")
+		self.registry.start()
+		self.assertTrue(self.registry.synced)
+		self.assertEqual(self.registry.get("datalab_a").id, "a")
+
+
+class RegistryEventsTest(FakeDaemonTestCase):
+
+	def setUp(self):
+		FakeDaemonTestCase.setUp(self)
+		self.datalab = self.connect(watch_events=True)
+		self.events = []
+		self.datalab.registry.add_event_listener(self.events.append)
+
+	def test_startup_lists_once(self):
+		calls = self.daemon.snapshot()
+		self.assertEqual(calls["containers.list"], 1)
+		self.assertEqual(calls["events"], 1)
+		self.assertEqual(len(self.datalab.get_datalab_ctrs()), self.containers)
+
+	def test_create_rename_destroy(self):
+		registry = self.datalab.registry
+		ctr = self.daemon.add_container("datalab_new", "project-new", 9000)
+		self.daemon.emit(u"create", ctr.id)
+		wait_for(lambda: registry.get("datalab_new") is not None)
+
+		ctr.name = "datalab_renamed"
+		self.daemon.emit(u"rename", ctr.id)
+		wait_for(lambda: registry.get("datalab_renamed") is not None)
+		self.assertIsNone(registry.get("datalab_new"))
+
+		ctr.state = u"running"
+		self.daemon.emit(u"start", ctr.id)
+		wait_for(lambda: self.datalab.is_ctr_running(registry.get("datalab_renamed")))
+
+		self.daemon.containers.pop(ctr.id)
+		self.daemon.emit(u"destroy", ctr.id)
+		wait_for(lambda: registry.get("datalab_renamed") is None)
+		self.assertEqual(
+			[event["Action"] for event in self.events],
+			[u"create", u"rename", u"start", u"destroy"]
+		)
+
+	def test_resyncs_after_stream_closes(self):
+		self.daemon.streams[0].close()
+		wait_for(lambda: self.daemon.snapshot().get("containers.list") == 2)
+		wait_for(lambda: self.events and self.events[-1]["Action"] == "resync")
+		self.assertEqual(self.daemon.snapshot()["events"], 2)
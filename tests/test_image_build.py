@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from src.image_build import BuildCancelled
+from tests.support import FakeDaemonTestCase
+
+
+class BuildImageTest(FakeDaemonTestCase):
+
+	def setUp(self):
+		FakeDaemonTestCase.setUp(self)
+		self.datalab = self.connect()
+		self.responses = []
+		self.datalab.cli.api.hooks["response"].append(
+			lambda response, *args, **kwargs: self.responses.append(response)
+		)
+
+	def test_build(self):
+		messages = []
+		image_id = self.datalab.build_image(
+			path=self.workspace.latest_dockerfile, tag="dll_datalab:staging",
+			progress=messages.append
+		)
+		self.assertEqual(image_id, self.daemon.find_image("dll_datalab:staging").id)
+		self.assertTrue(messages[0].startswith("Step 1/1"))
+		# Only the test's own hook is left, and the response is closed
+		self.assertEqual(len(self.datalab.cli.api.hooks["response"]), 1)
+		self.assertTrue(self.responses[0].closed.is_set())
+
+	def test_cancel_silent_build(self):
+		# No output arrives after the first step, so only the timer sees cancel
+		self.daemon.build_hangs = True
+		cancel = threading.Event()
+		errors = []
+
+		def build():
+			try:
+				self.datalab.build_image(
+					path=self.workspace.latest_dockerfile, tag="dll_datalab:staging",
+					cancel=cancel
+				)
+			except Exception as e:
+				errors.append(e)
+
+		thread = threading.Thread(target=build)
+		thread.start()
+		time.sleep(0.3)
+		cancel.set()
+		start = time.time()
+		thread.join(2)
+		self.assertFalse(thread.is_alive())
+		self.assertLess(time.time() - start, 1)
+		self.assertIsInstance(errors[0], BuildCancelled)
+		# The connection was dropped, so the daemon gives up on the build
+		self.assertTrue(self.responses[0].closed.is_set())
+		self.assertRaises(Exception, self.daemon.find_image, "dll_datalab:staging")
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+
+from src.jobs import JobExecutor
+
+
+class JobExecutorTest(unittest.TestCase):
+
+	def setUp(self):
+		self.executor = JobExecutor(max_workers=2)
+		self.release = threading.Event()
+		self.addCleanup(self.executor.shutdown)
+		self.addCleanup(self.release.set)
+
+	def wait_for(self, condition, timeout=2):
+		end = time.time() + timeout
+		while not condition():
+			if time.time() > end:
+				self.fail("Timed out waiting for the executor")
+			time.sleep(0.01)
+
+	def test_same_key_runs_in_order(self):
+		order = []
+		running = []
+		overlaps = []
+
+		def work(index):
+			running.append(index)
+			if len(running) > 1:
+				overlaps.append(index)
+			self.release.wait(2)
+			order.append(index)
+			running.remove(index)
+
+		jobs = [
+			self.executor.submit("Work", work, args=(index,), key="ctr", dedupe=False)
+			for index in range(5)
+		]
+		# Only the first holds a worker; the rest wait off the pool
+		self.assertEqual([job.future is not None for job in jobs], [True] + [False] * 4)
+		self.release.set()
+		# The key is dropped once its queue drains
+		self.wait_for(lambda: not self.executor.waiting)
+		self.assertEqual([job.status for job in jobs], ["done"] * 5)
+		self.assertEqual(order, list(range(5)))
+		self.assertEqual(overlaps, [])
+
+	def test_busy_key_does_not_starve_others(self):
+		for index in range(10):
+			self.executor.submit(
+				"Stop", self.release.wait, args=(2,), key="ctr", dedupe=False
+			)
+		other = self.executor.submit("Start", lambda: "started", key="other")
+		self.assertEqual(other.future.result(1), "started")
+		self.assertEqual(len(self.executor.waiting["ctr"]), 9)
+
+	def test_duplicate_returns_existing_job(self):
+		first = self.executor.submit("Stop", self.release.wait, args=(2,), key="ctr")
+		self.assertIs(self.executor.submit("Stop", self.release.wait, key="ctr"), first)
+
+	def test_cancel_queued_job(self):
+		first = self.executor.submit("Stop", self.release.wait, args=(2,), key="ctr")
+		calls = []
+		queued = self.executor.submit("Start", calls.append, args=(1,), key="ctr")
+		self.assertTrue(self.executor.cancel(queued.id))
+		self.assertEqual(queued.status, "cancelled")
+		self.release.set()
+		self.wait_for(lambda: not self.executor.waiting)
+		self.assertEqual(first.status, "done")
+		self.assertEqual(calls, [])
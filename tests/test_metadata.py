@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from tests.support import FakeDaemonTestCase
+
+
+class GatherMetadataTest(FakeDaemonTestCase):
+
+	def rows(self, datalab):
+		return dict(
+			(info["Name"], (info["Project ID"], info["User"]))
+			for info in datalab.get_ctrs_info()
+		)
+
+	def test_all_gathered(self):
+		datalab = self.connect()
+		rows = self.rows(datalab)
+		self.assertEqual(
+			rows["datalab_0001"], ("project-1", "user1@example.com")
+		)
+		self.assertNotIn(("unknown", "unknown"), rows.values())
+
+	def test_hung_containers_time_out(self):
+		# Both workers hang, so the other lookups never even start
+		self.daemon.hang("datalab_0000")
+		self.daemon.hang("datalab_0001")
+		datalab = self.connect(metadata_workers=2, metadata_timeout=1)
+		start = time.time()
+		rows = self.rows(datalab)
+		self.assertLess(time.time() - start, 2)
+		self.assertEqual(rows["datalab_0000"], ("unknown", "unknown"))
+		self.assertEqual(rows["datalab_0001"], ("unknown", "unknown"))
+
+		# The hung lookups aren't resubmitted behind their own workers
+		start = time.time()
+		rows = self.rows(datalab)
+		self.assertLess(time.time() - start, 2)
+		self.assertEqual(rows["datalab_0000"], ("unknown", "unknown"))
+
+		self.daemon.release()
+		time.sleep(0.2)
+		rows = self.rows(datalab)
+		self.assertEqual(
+			rows["datalab_0000"], ("project-0", "user0@example.com")
+		)
+		self.assertEqual(
+			rows["datalab_0003"], ("project-3", "user3@example.com")
+		)
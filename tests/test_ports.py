@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+
+from tests.support import FakeDaemonTestCase
+
+
+class AllocatePortTest(FakeDaemonTestCase):
+
+	def test_skips_claimed_and_bound_ports(self):
+		datalab = self.connect(port_range=(8081, 8200))
+		# The fake's containers hold 8081-8084, running or not
+		self.assertEqual(datalab.get_claimed_ports(), set(range(8081, 8085)))
+		sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.addCleanup(sock.close)
+		try:
+			sock.bind(("127.0.0.1", 8085))
+		except socket.error:
+			pass
+		port = datalab.allocate_port()
+		self.assertGreater(port, 8085)
+		self.assertTrue(datalab.is_port_free(port))
+
+	def test_exhausted_range(self):
+		datalab = self.connect(port_range=(8081, 8084))
+		self.assertRaises(Exception, datalab.allocate_port)
+
+	def test_concurrent_creates_get_distinct_ports(self):
+		datalab = self.connect(port_range=(8081, 8200))
+		ctrs = []
+
+		def create(index):
+			ctrs.append(datalab.create_container(
+				"datalab_new_%s" % index, "project", "Local", None,
+				self.workspace.local_drive, []
+			))
+
+		threads = [threading.Thread(target=create, args=(index,)) for index in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		ports = [
+			int(datalab.get_ctr_address(ctr).rstrip("/").rsplit(":", 1)[1])
+			for ctr in ctrs
+		]
+		self.assertEqual(len(set(ports)), 8)
+		self.assertFalse(set(ports) & set(range(8081, 8085)))
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+import unittest
+
+try:
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+	from SocketServer import ThreadingMixIn
+except ImportError:
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn
+
+from src.readiness import wait_until_ready
+
+
+# Answers 503 until `failures` requests have been made, then 200
+class StartingHandler(BaseHTTPRequestHandler):
+
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		server = self.server
+		with server.lock:
+			server.requests += 1
+			status = 503 if server.requests <= server.failures else 200
+		body = b"starting" if status == 503 else b"ready"
+		self.send_response(status)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+
+class StartingServer(ThreadingMixIn, HTTPServer):
+
+	daemon_threads = True
+
+	def __init__(self, failures):
+		HTTPServer.__init__(self, ("127.0.0.1", 0), StartingHandler)
+		self.failures = failures
+		self.requests = 0
+		self.lock = threading.Lock()
+
+
+class WaitUntilReadyTest(unittest.TestCase):
+
+	def serve(self, failures):
+		server = StartingServer(failures)
+		thread = threading.Thread(target=server.serve_forever)
+		thread.daemon = True
+		thread.start()
+		self.addCleanup(server.server_close)
+		self.addCleanup(server.shutdown)
+		return server, "http://127.0.0.1:%s/" % server.server_address[1]
+
+	def test_ready(self):
+		server, address = self.serve(failures=3)
+		attempts = []
+		ready_time = wait_until_ready(
+			address, deadline=5, initial_delay=0.01,
+			on_attempt=lambda attempt, elapsed: attempts.append(attempt)
+		)
+		self.assertEqual(server.requests, 4)
+		self.assertEqual(attempts, [1, 2, 3])
+		self.assertLess(ready_time, 5)
+
+	def test_deadline(self):
+		server, address = self.serve(failures=1000)
+		with self.assertRaises(Exception):
+			wait_until_ready(address, deadline=0.5, initial_delay=0.01, max_delay=0.1)
+		self.assertGreater(server.requests, 1)
+
+	def test_nothing_listening(self):
+		sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		sock.bind(("127.0.0.1", 0))
+		address = "http://127.0.0.1:%s/" % sock.getsockname()[1]
+		sock.close()
+		with self.assertRaises(Exception):
+			wait_until_ready(address, deadline=0.3, initial_delay=0.01, timeout=0.1)
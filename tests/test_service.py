@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+from src.image_build import BuildCancelled
+from src.service import DataLabService, RemoteDataLabAPI
+from tests.support import FakeDaemonTestCase
+
+
+def wait_for(condition, timeout=3):
+	end = time.time() + timeout
+	while not condition():
+		if time.time() > end:
+			raise AssertionError("Timed out waiting for the service")
+		time.sleep(0.01)
+
+
+class ServiceTest(FakeDaemonTestCase):
+
+	def setUp(self):
+		FakeDaemonTestCase.setUp(self)
+		self.datalab = self.connect(watch_events=True)
+		self.responses = []
+		self.datalab.cli.api.hooks["response"].append(
+			lambda response, *args, **kwargs: self.responses.append(response)
+		)
+		socket_path = os.path.join(self.workspace.root, "service.sock")
+		self.service = DataLabService(self.datalab, socket_path)
+		thread = threading.Thread(target=self.service.serve_forever)
+		thread.daemon = True
+		thread.start()
+		wait_for(lambda: os.path.exists(socket_path))
+		self.remote = RemoteDataLabAPI(socket_path)
+
+	def tearDown(self):
+		self.remote.close()
+		self.service.shutdown()
+		FakeDaemonTestCase.tearDown(self)
+
+	def test_update(self):
+		self.remote.update_image(self.workspace.latest_dockerfile)
+		self.assertIsNotNone(self.daemon.find_image("dll_datalab:latest"))
+		self.assertEqual(len(self.responses), 1)
+
+	def test_cancel_update(self):
+		self.daemon.build_hangs = True
+		cancel = threading.Event()
+		errors = []
+
+		def update():
+			try:
+				self.remote.update_image(self.workspace.latest_dockerfile, cancel=cancel)
+			except Exception as e:
+				errors.append(e)
+
+		thread = threading.Thread(target=update)
+		thread.start()
+		wait_for(lambda: self.responses)
+		cancel.set()
+		thread.join(2)
+		self.assertFalse(thread.is_alive())
+		self.assertIsInstance(errors[0], BuildCancelled)
+		# The service saw the hang up and abandoned the build
+		wait_for(lambda: self.responses[0].closed.is_set())
+		self.assertRaises(Exception, self.daemon.find_image, "dll_datalab:staging")
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import platform
+
+from tests.support import FakeDaemonTestCase
+
+
+class FromSettingsTest(FakeDaemonTestCase):
+
+	def build(self, **settings):
+		from src.datalab_api import DataLabAPI
+		settings.update({
+			"docker_client_timeout": 30,
+			"local_drive": self.workspace.local_drive
+		})
+		datalab = DataLabAPI.from_settings(
+			platform.system(), settings, self.workspace.containers_logfile,
+			watch_events=False
+		)
+		self.apis.append(datalab)
+		return datalab
+
+	def test_settings_passed_through(self):
+		datalab = self.build(
+			port_range=[9000, 9010], containers_log_interval=7, stop_timeout=3,
+			standby_pool_size=2
+		)
+		self.assertEqual(datalab.port_range, [9000, 9010])
+		self.assertEqual(datalab.ctrs_log_interval, 7)
+		self.assertEqual(datalab.stop_timeout, 3)
+		self.assertEqual(datalab.standby_pool.size, 2)
+
+	def test_missing_settings_take_defaults(self):
+		datalab = self.build()
+		self.assertEqual(datalab.port_range, (8081, 8180))
+		self.assertEqual(datalab.metadata_timeout, 5)
+		self.assertEqual(datalab.standby_pool.drives, [])
+		self.assertEqual(datalab.idle_manager.pause_after, 0)
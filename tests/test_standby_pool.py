@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+from tests.support import FakeDaemonTestCase
+
+
+def wait_for(condition, timeout=5):
+	end = time.time() + timeout
+	while not condition():
+		if time.time() > end:
+			raise AssertionError("Timed out waiting for the standby pool")
+		time.sleep(0.01)
+
+
+class StandbyPoolTest(FakeDaemonTestCase):
+
+	def setUp(self):
+		FakeDaemonTestCase.setUp(self)
+		self.datalab = self.connect(port_range=(8081, 8200), standby_pool_size=2)
+		self.pool = self.datalab.standby_pool
+		self.pool.start()
+		wait_for(lambda: len(self.pool.members()) == 2)
+
+	def tearDown(self):
+		# Let a fill in progress finish before the workspace goes
+		self.pool.stop()
+		self.pool.executor.shutdown(wait=True)
+		FakeDaemonTestCase.tearDown(self)
+
+	def daemon_names(self):
+		return sorted(ctr.name for ctr in self.daemon.containers.values())
+
+	def test_concurrent_claims_get_distinct_spares(self):
+		spares = set(ctr.id for ctr in self.pool.members())
+		# Slow daemon calls widen the window between picking a spare and the
+		# registry seeing it renamed
+		self.daemon.latency = 0.02
+		ctrs = {}
+
+		def create(name):
+			ctrs[name] = self.datalab.create_container(
+				name, "project-" + name, "Local", None,
+				self.workspace.local_drive, []
+			)
+
+		threads = [threading.Thread(target=create, args=(name,)) for name in ["alice", "bob"]]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertNotEqual(ctrs["alice"].id, ctrs["bob"].id)
+		self.assertEqual(set([ctrs["alice"].id, ctrs["bob"].id]), spares)
+		self.assertIn("alice", self.daemon_names())
+		self.assertIn("bob", self.daemon_names())
+		self.assertNotEqual(
+			self.datalab.ctrs_log.get("alice", "DRIVE"),
+			self.datalab.ctrs_log.get("bob", "DRIVE")
+		)
+
+	def test_old_spares_removed_with_their_drives(self):
+		drives = [
+			self.pool.drive_path(self.datalab.get_ctr_name(ctr))
+			for ctr in self.pool.members()
+		]
+		self.assertTrue(all(os.path.isdir(drive) for drive in drives))
+		self.daemon.add_image("dll_datalab:latest")
+		self.pool.refill()
+		image = self.datalab.get_image_info()
+		wait_for(lambda: len(self.pool.members()) == 2 and all(
+			ctr.attrs.get(u"ImageID") == image["id"] for ctr in self.pool.members()
+		))
+		self.assertFalse(any(os.path.exists(drive) for drive in drives))